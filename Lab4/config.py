@@ -3,6 +3,8 @@
 """
 
 import os
+import string
+import zlib
 from typing import List, Dict, Any
 
 # Конфигурация парсера
@@ -11,6 +13,8 @@ PARSER_CONFIG = {
     'timeout': 10,
     'max_pages': 50,  # Максимальное количество страниц для парсинга
     'max_content_length': 1000000,  # Максимальный размер контента в байтах
+    'fetch_workers': 16,  # Количество потоков для параллельной загрузки
+    'per_host_delay': 0.5,  # Минимальный интервал между запросами к одному хосту (сек)
 }
 
 # Список начальных URL для парсинга (примеры)
@@ -45,12 +49,20 @@ SEARCH_CONFIG = {
     'snippet_length': 150,
 }
 
-# Список стоп-слов (упрощенный)
-STOP_WORDS = {
+# Список стоп-слов (упрощенный); frozenset — неизменяемый, с быстрым поиском
+STOP_WORDS = frozenset({
     'a', 'an', 'the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
     'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'being',
     'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'shall',
     'should', 'may', 'might', 'must', 'can', 'could', 'i', 'you', 'he',
     'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us', 'them', 'this',
-    'that', 'these', 'those', 'am', 'is', 'are'
-}
\ No newline at end of file
+    'that', 'these', 'those', 'am'
+})
+
+# Таблица перевода для удаления пунктуации на уровне C (str.translate)
+PUNCTUATION_TRANSLATE = str.maketrans('', '', string.punctuation)
+
+# CRC32-хэши стоп-слов: префильтр для компилируемых токенизаторов
+# (Cython/DFA), где сравнение целых дешевле сравнения строк;
+# проверка: h in STOP_WORDS_HASHES and word in STOP_WORDS
+STOP_WORDS_HASHES = frozenset(zlib.crc32(word.encode()) for word in STOP_WORDS)
\ No newline at end of file
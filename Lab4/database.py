@@ -1,362 +1,785 @@
-"""
-Модуль для работы с базой данных
-"""
-
-import sqlite3
-import json
-from typing import List, Dict, Set, Tuple, Any, Optional
-import logging
-from datetime import datetime
-from utils import logger
-
-
-class Database:
-    """Класс для работы с базой данных поискового движка"""
-
-    def __init__(self, db_name: str = 'search_engine.db'):
-        self.db_name = db_name
-        self.conn = None
-        self.cursor = None
-        self._initialize_database()
-
-    def _initialize_database(self):
-        """Инициализация базы данных и создание таблиц"""
-        try:
-            self.conn = sqlite3.connect(self.db_name)
-            self.cursor = self.conn.cursor()
-
-            # Таблица документов
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS documents (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    url TEXT UNIQUE NOT NULL,
-                    title TEXT,
-                    content TEXT,
-                    content_length INTEGER,
-                    parsed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    indexed BOOLEAN DEFAULT FALSE
-                )
-            ''')
-
-            # Таблица слов
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS words (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    word TEXT UNIQUE NOT NULL,
-                    frequency INTEGER DEFAULT 0
-                )
-            ''')
-
-            # Таблица ссылок
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS links (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    source_doc_id INTEGER NOT NULL,
-                    target_url TEXT NOT NULL,
-                    target_doc_id INTEGER,
-                    FOREIGN KEY (source_doc_id) REFERENCES documents (id),
-                    FOREIGN KEY (target_doc_id) REFERENCES documents (id),
-                    UNIQUE(source_doc_id, target_url)
-                )
-            ''')
-
-            # Таблица обратного индекса
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS inverted_index (
-                    word_id INTEGER NOT NULL,
-                    doc_id INTEGER NOT NULL,
-                    tf REAL DEFAULT 0.0,
-                    positions TEXT,  -- JSON список позиций
-                    PRIMARY KEY (word_id, doc_id),
-                    FOREIGN KEY (word_id) REFERENCES words (id),
-                    FOREIGN KEY (doc_id) REFERENCES documents (id)
-                )
-            ''')
-
-            # Таблица PageRank
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS pagerank (
-                    doc_id INTEGER PRIMARY KEY,
-                    pagerank REAL DEFAULT 1.0,
-                    iteration INTEGER DEFAULT 0,
-                    FOREIGN KEY (doc_id) REFERENCES documents (id)
-                )
-            ''')
-
-            self.conn.commit()
-            logger.info("Database initialized successfully")
-
-        except sqlite3.Error as e:
-            logger.error(f"Database initialization error: {e}")
-            if self.conn:
-                self.conn.rollback()
-            raise
-
-    def add_document(self, url: str, title: str, content: str) -> int:
-        """Добавление документа в базу данных"""
-        try:
-            content_length = len(content)
-
-            self.cursor.execute('''
-                INSERT OR IGNORE INTO documents (url, title, content, content_length)
-                VALUES (?, ?, ?, ?)
-            ''', (url, title, content, content_length))
-
-            # Получаем ID документа
-            self.cursor.execute('SELECT id FROM documents WHERE url = ?', (url,))
-            result = self.cursor.fetchone()
-
-            if result:
-                doc_id = result[0]
-                # Обновляем title и content если документ уже существует
-                self.cursor.execute('''
-                    UPDATE documents 
-                    SET title = ?, content = ?, content_length = ?
-                    WHERE id = ?
-                ''', (title, content, content_length, doc_id))
-            else:
-                self.cursor.execute('''
-                    INSERT INTO documents (url, title, content, content_length)
-                    VALUES (?, ?, ?, ?)
-                ''', (url, title, content, content_length))
-                doc_id = self.cursor.lastrowid
-
-            self.conn.commit()
-            logger.debug(f"Document added: {url} (ID: {doc_id})")
-            return doc_id
-
-        except sqlite3.Error as e:
-            logger.error(f"Error adding document {url}: {e}")
-            self.conn.rollback()
-            return -1
-
-    def get_document_id(self, url: str) -> Optional[int]:
-        """Получение ID документа по URL"""
-        try:
-            self.cursor.execute('SELECT id FROM documents WHERE url = ?', (url,))
-            result = self.cursor.fetchone()
-            return result[0] if result else None
-        except sqlite3.Error as e:
-            logger.error(f"Error getting document ID for {url}: {e}")
-            return None
-
-    def add_word(self, word: str) -> int:
-        """Добавление слова в базу данных"""
-        try:
-            # Пытаемся получить существующее слово
-            self.cursor.execute('SELECT id FROM words WHERE word = ?', (word,))
-            result = self.cursor.fetchone()
-
-            if result:
-                word_id = result[0]
-                # Обновляем частоту
-                self.cursor.execute('UPDATE words SET frequency = frequency + 1 WHERE id = ?', (word_id,))
-            else:
-                # Добавляем новое слово
-                self.cursor.execute('INSERT INTO words (word, frequency) VALUES (?, 1)', (word,))
-                word_id = self.cursor.lastrowid
-
-            self.conn.commit()
-            return word_id
-
-        except sqlite3.Error as e:
-            logger.error(f"Error adding word {word}: {e}")
-            self.conn.rollback()
-            return -1
-
-    def add_link(self, source_doc_id: int, target_url: str, target_doc_id: Optional[int] = None):
-        """Добавление ссылки между документами"""
-        try:
-            self.cursor.execute('''
-                INSERT OR IGNORE INTO links (source_doc_id, target_url, target_doc_id)
-                VALUES (?, ?, ?)
-            ''', (source_doc_id, target_url, target_doc_id))
-
-            self.conn.commit()
-
-        except sqlite3.Error as e:
-            logger.error(f"Error adding link from {source_doc_id} to {target_url}: {e}")
-            self.conn.rollback()
-
-    def add_inverted_index_entry(self, word_id: int, doc_id: int, tf: float, positions: List[int]):
-        """Добавление записи в обратный индекс"""
-        try:
-            positions_json = json.dumps(positions)
-
-            self.cursor.execute('''
-                INSERT OR REPLACE INTO inverted_index (word_id, doc_id, tf, positions)
-                VALUES (?, ?, ?, ?)
-            ''', (word_id, doc_id, tf, positions_json))
-
-            self.conn.commit()
-
-        except sqlite3.Error as e:
-            logger.error(f"Error adding inverted index entry: {e}")
-            self.conn.rollback()
-
-    def update_pagerank(self, doc_id: int, pagerank: float, iteration: int):
-        """Обновление значения PageRank для документа"""
-        try:
-            self.cursor.execute('''
-                INSERT OR REPLACE INTO pagerank (doc_id, pagerank, iteration)
-                VALUES (?, ?, ?)
-            ''', (doc_id, pagerank, iteration))
-
-            self.conn.commit()
-
-        except sqlite3.Error as e:
-            logger.error(f"Error updating PageRank for document {doc_id}: {e}")
-            self.conn.rollback()
-
-    def get_all_documents(self) -> List[Tuple[int, str, str]]:
-        """Получение всех документов"""
-        try:
-            self.cursor.execute('SELECT id, url, title FROM documents')
-            return self.cursor.fetchall()
-        except sqlite3.Error as e:
-            logger.error(f"Error getting all documents: {e}")
-            return []
-
-    def get_document_content(self, doc_id: int) -> Optional[str]:
-        """Получение содержимого документа по ID"""
-        try:
-            self.cursor.execute('SELECT content FROM documents WHERE id = ?', (doc_id,))
-            result = self.cursor.fetchone()
-            return result[0] if result else None
-        except sqlite3.Error as e:
-            logger.error(f"Error getting document content for ID {doc_id}: {e}")
-            return None
-
-    def get_document_url(self, doc_id: int) -> Optional[str]:
-        """Получение URL документа по ID"""
-        try:
-            self.cursor.execute('SELECT url FROM documents WHERE id = ?', (doc_id,))
-            result = self.cursor.fetchone()
-            return result[0] if result else None
-        except sqlite3.Error as e:
-            logger.error(f"Error getting document URL for ID {doc_id}: {e}")
-            return None
-
-    def get_outgoing_links(self, doc_id: int) -> List[Tuple[int, str]]:
-        """Получение исходящих ссылок документа"""
-        try:
-            self.cursor.execute('''
-                SELECT target_doc_id, target_url 
-                FROM links 
-                WHERE source_doc_id = ?
-            ''', (doc_id,))
-            return self.cursor.fetchall()
-        except sqlite3.Error as e:
-            logger.error(f"Error getting outgoing links for document {doc_id}: {e}")
-            return []
-
-    def get_incoming_links(self, doc_id: int) -> List[int]:
-        """Получение входящих ссылок документа"""
-        try:
-            self.cursor.execute('''
-                SELECT source_doc_id 
-                FROM links 
-                WHERE target_doc_id = ?
-            ''', (doc_id,))
-            results = self.cursor.fetchall()
-            return [row[0] for row in results] if results else []
-        except sqlite3.Error as e:
-            logger.error(f"Error getting incoming links for document {doc_id}: {e}")
-            return []
-
-    def get_documents_for_word(self, word: str) -> List[Tuple[int, float]]:
-        """Получение документов, содержащих слово"""
-        try:
-            self.cursor.execute('''
-                SELECT ii.doc_id, ii.tf
-                FROM inverted_index ii
-                JOIN words w ON ii.word_id = w.id
-                WHERE w.word = ?
-            ''', (word,))
-            results = self.cursor.fetchall()
-
-            # Преобразуем результаты: tf хранится как абсолютная частота
-            formatted_results = []
-            for doc_id, tf in results:
-                formatted_results.append((doc_id, float(tf)))
-
-            return formatted_results
-
-        except sqlite3.Error as e:
-            logger.error(f"Error getting documents for word {word}: {e}")
-            return []
-
-    def get_word_frequency(self, word: str) -> int:
-        """Получение частоты слова"""
-        try:
-            self.cursor.execute('SELECT frequency FROM words WHERE word = ?', (word,))
-            result = self.cursor.fetchone()
-            return result[0] if result else 0
-        except sqlite3.Error as e:
-            logger.error(f"Error getting frequency for word {word}: {e}")
-            return 0
-
-    def get_total_documents(self) -> int:
-        """Получение общего количества документов"""
-        try:
-            self.cursor.execute('SELECT COUNT(*) FROM documents')
-            result = self.cursor.fetchone()
-            return result[0] if result else 0
-        except sqlite3.Error as e:
-            logger.error(f"Error getting total documents count: {e}")
-            return 0
-
-    def get_pagerank(self, doc_id: int) -> float:
-        """Получение значения PageRank для документа"""
-        try:
-            self.cursor.execute('SELECT pagerank FROM pagerank WHERE doc_id = ?', (doc_id,))
-            result = self.cursor.fetchone()
-            return result[0] if result else 1.0
-        except sqlite3.Error as e:
-            logger.error(f"Error getting PageRank for document {doc_id}: {e}")
-            return 1.0
-
-    def get_all_pageranks(self) -> Dict[int, float]:
-        """Получение всех значений PageRank"""
-        try:
-            self.cursor.execute('SELECT doc_id, pagerank FROM pagerank')
-            results = self.cursor.fetchall()
-            return {doc_id: pagerank for doc_id, pagerank in results}
-        except sqlite3.Error as e:
-            logger.error(f"Error getting all PageRanks: {e}")
-            return {}
-
-    def get_document_info(self, doc_id: int) -> Optional[Tuple[str, str]]:
-        """Получение информации о документе"""
-        try:
-            self.cursor.execute('SELECT url, title FROM documents WHERE id = ?', (doc_id,))
-            result = self.cursor.fetchone()
-            return result if result else None
-        except sqlite3.Error as e:
-            logger.error(f"Error getting document info for ID {doc_id}: {e}")
-            return None
-
-    def clear_database(self):
-        """Очистка базы данных (для тестирования)"""
-        try:
-            tables = ['documents', 'words', 'links', 'inverted_index', 'pagerank']
-            for table in tables:
-                self.cursor.execute(f'DELETE FROM {table}')
-
-            self.cursor.execute('DELETE FROM sqlite_sequence')
-            self.conn.commit()
-            logger.info("Database cleared successfully")
-
-        except sqlite3.Error as e:
-            logger.error(f"Error clearing database: {e}")
-            self.conn.rollback()
-
-    def close(self):
-        """Закрытие соединения с базой данных"""
-        if self.conn:
-            self.conn.close()
-            logger.info("Database connection closed")
-
-    def __del__(self):
-        """Деструктор"""
-        self.close()
\ No newline at end of file
+"""
+Модуль для работы с базой данных
+"""
+
+import sqlite3
+import functools
+import itertools
+from contextlib import contextmanager
+from typing import List, Dict, Set, Tuple, Any, Optional, Iterator
+import logging
+from datetime import datetime
+from utils import logger
+
+
+# Масштаб фиксированной точки для хранения tf/pagerank целыми числами:
+# ~6 значащих цифр достаточно, а целочисленные столбцы компактнее и
+# сравниваются быстрее, чем 8-байтовые double
+FIXED_POINT_SCALE = 1_000_000
+
+
+def pack_positions(positions: List[int]) -> bytes:
+    """Упаковка списка позиций в BLOB: дельты между соседними позициями,
+    закодированные varint (LEB128) — позиции монотонно растут, поэтому
+    дельты малы и чаще всего занимают один байт"""
+    out = bytearray()
+    prev = 0
+    for position in positions:
+        delta = position - prev
+        while delta >= 0x80:
+            out.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        out.append(delta)
+        prev = position
+    return bytes(out)
+
+
+def unpack_positions(blob: bytes) -> List[int]:
+    """Распаковка varint-дельта BLOB в список позиций"""
+    positions = []
+    prev = 0
+    delta = 0
+    shift = 0
+    for byte in blob:
+        delta |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            prev += delta
+            positions.append(prev)
+            delta = 0
+            shift = 0
+    return positions
+
+
+class Database:
+    """Класс для работы с базой данных поискового движка"""
+
+    def __init__(self, db_name: str = 'search_engine.db'):
+        self.db_name = db_name
+        self.conn = None
+        self.cursor = None
+        self._in_transaction = False
+        # Кэш id -> (url, title): документы неизменяемы после индексации
+        self._url_title_cache: Dict[int, Tuple[str, str]] = {}
+        # Кэш графа входящих ссылок (см. get_full_adjacency)
+        self._adjacency: Optional[Dict[int, List[int]]] = None
+        # Слова, чьи записи скопированы в горячую in-memory таблицу
+        self._hot_words: Set[int] = set()
+        # Ревизия графа ссылок и кэш построенных CSR-структур
+        # (см. PageRankMapReduce): инкремент на каждом изменении ребер
+        self.graph_revision = 0
+        self._csr_cache: Dict[Tuple[int, int], Tuple] = {}
+        self._initialize_database()
+
+    def _initialize_database(self):
+        """Инициализация базы данных и создание таблиц"""
+        try:
+            # isolation_level=None: транзакциями управляем явно (см. transaction());
+            # check_same_thread=False: WAL сериализует параллельные записи
+            self.conn = sqlite3.connect(self.db_name, isolation_level=None,
+                                        check_same_thread=False)
+            self.cursor = self.conn.cursor()
+
+            # Настройка SQLite: WAL-журнал, меньше fsync, большой кэш страниц
+            self.cursor.executescript('''
+                PRAGMA journal_mode=WAL;
+                PRAGMA synchronous=NORMAL;
+                PRAGMA temp_store=MEMORY;
+                PRAGMA cache_size=-262144;
+                PRAGMA mmap_size=268435456;
+            ''')
+
+            # Таблица документов
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS documents (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    url TEXT UNIQUE NOT NULL,
+                    title TEXT,
+                    content TEXT,
+                    content_length INTEGER,
+                    total_terms INTEGER DEFAULT 0,
+                    parsed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    indexed BOOLEAN DEFAULT FALSE
+                )
+            ''')
+
+            # Таблица слов
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS words (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    word TEXT UNIQUE NOT NULL,
+                    frequency INTEGER DEFAULT 0
+                )
+            ''')
+
+            # Таблица ссылок
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS links (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    source_doc_id INTEGER NOT NULL,
+                    target_url TEXT NOT NULL,
+                    target_doc_id INTEGER,
+                    FOREIGN KEY (source_doc_id) REFERENCES documents (id),
+                    FOREIGN KEY (target_doc_id) REFERENCES documents (id),
+                    UNIQUE(source_doc_id, target_url)
+                )
+            ''')
+
+            # Таблица обратного индекса
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS inverted_index (
+                    word_id INTEGER NOT NULL,
+                    doc_id INTEGER NOT NULL,
+                    tf INTEGER DEFAULT 0,  -- фиксированная точка, x1e6
+                    positions BLOB,  -- varint-дельта список позиций
+                    PRIMARY KEY (word_id, doc_id),
+                    FOREIGN KEY (word_id) REFERENCES words (id),
+                    FOREIGN KEY (doc_id) REFERENCES documents (id)
+                )
+            ''')
+
+            # Таблица PageRank
+            self.cursor.execute('''
+                CREATE TABLE IF NOT EXISTS pagerank (
+                    doc_id INTEGER PRIMARY KEY,
+                    pagerank INTEGER DEFAULT 1000000,  -- фиксированная точка, x1e6
+                    iteration INTEGER DEFAULT 0,
+                    FOREIGN KEY (doc_id) REFERENCES documents (id)
+                )
+            ''')
+
+            # Индексы для точечных выборок вместо полного сканирования таблиц
+            self.cursor.execute(
+                'CREATE INDEX IF NOT EXISTS idx_words_word ON words (word)')
+            self.cursor.execute(
+                'CREATE INDEX IF NOT EXISTS idx_links_target ON links (target_doc_id)')
+            # Покрывающий индекс: выборка doc_id/tf по word_id без чтения строк
+            self.cursor.execute(
+                'CREATE INDEX IF NOT EXISTS idx_inverted_word ON inverted_index (word_id, doc_id, tf)')
+
+            # Горячая in-memory копия часто запрашиваемой части обратного
+            # индекса: повторные запросы слова идут в RAM, минуя диск
+            self.cursor.execute("ATTACH ':memory:' AS hot")
+            self.cursor.execute('''
+                CREATE TABLE hot.inverted_index (
+                    word_id INTEGER NOT NULL,
+                    doc_id INTEGER NOT NULL,
+                    tf INTEGER DEFAULT 0,
+                    PRIMARY KEY (word_id, doc_id)
+                )
+            ''')
+
+            # Предзагрузка кэша url/title
+            self.cursor.execute('SELECT id, url, title FROM documents')
+            self._url_title_cache = {
+                doc_id: (url, title) for doc_id, url, title in self.cursor.fetchall()
+            }
+
+            logger.info("Database initialized successfully")
+
+        except sqlite3.Error as e:
+            logger.error("Database initialization error: %s", e)
+            raise
+
+    @contextmanager
+    def transaction(self):
+        """Контекстный менеджер для пакетной записи в одной транзакции"""
+        self.cursor.execute('BEGIN IMMEDIATE')
+        self._in_transaction = True
+        try:
+            yield
+            self.conn.commit()
+        except BaseException as e:
+            # Откат на любом исключении (включая KeyboardInterrupt):
+            # иначе транзакция остается открытой и каждый следующий
+            # BEGIN IMMEDIATE падает на уже заклиненном соединении
+            logger.error("Transaction error: %s", e)
+            self.conn.rollback()
+            raise
+        finally:
+            self._in_transaction = False
+
+    def __enter__(self):
+        """Вход в транзакцию: with db: ... вокруг пакета записей"""
+        self.cursor.execute('BEGIN IMMEDIATE')
+        self._in_transaction = True
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.conn.commit()
+        else:
+            self.conn.rollback()
+        self._in_transaction = False
+        return False
+
+    def add_document(self, url: str, title: str, content: str) -> int:
+        """Добавление документа в базу данных"""
+        try:
+            # Один UPSERT вместо INSERT OR IGNORE + SELECT + UPDATE
+            self.cursor.execute('''
+                INSERT INTO documents (url, title, content, content_length)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    title = excluded.title,
+                    content = excluded.content,
+                    content_length = excluded.content_length
+                RETURNING id
+            ''', (url, title, content, len(content)))
+            doc_id = self.cursor.fetchone()[0]
+
+            self._url_title_cache[doc_id] = (url, title)
+            self._get_document_content_cached.cache_clear()
+            self._get_document_id_cached.cache_clear()
+            logger.debug("Document added: %s (ID: %s)", url, doc_id)
+            return doc_id
+
+        except sqlite3.Error as e:
+            logger.error("Error adding document %s: %s", url, e)
+            return -1
+
+    def get_document_ids_bulk(self, urls: List[str]) -> Dict[str, int]:
+        """Получение ID документов для списка URL одним запросом на порцию
+        (по 500 из-за ограничения SQLite на число параметров)"""
+        try:
+            doc_ids = {}
+            for start in range(0, len(urls), 500):
+                chunk = urls[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                self.cursor.execute(
+                    f'SELECT url, id FROM documents WHERE url IN ({placeholders})', chunk)
+                doc_ids.update(self.cursor.fetchall())
+            return doc_ids
+        except sqlite3.Error as e:
+            logger.error("Error getting document IDs in bulk: %s", e)
+            return {}
+
+    def get_document_infos(self, doc_ids: List[int]) -> Dict[int, Tuple[str, str]]:
+        """Получение (url, title) для списка ID; кэш url/title покрывает
+        почти всё, остаток добирается порционными WHERE IN запросами"""
+        infos = {doc_id: self._url_title_cache[doc_id]
+                 for doc_id in doc_ids if doc_id in self._url_title_cache}
+
+        missing = [doc_id for doc_id in doc_ids if doc_id not in infos]
+        if missing:
+            try:
+                for start in range(0, len(missing), 500):
+                    chunk = missing[start:start + 500]
+                    placeholders = ','.join('?' * len(chunk))
+                    self.cursor.execute(
+                        f'SELECT id, url, title FROM documents WHERE id IN ({placeholders})',
+                        chunk)
+                    for doc_id, url, title in self.cursor.fetchall():
+                        infos[doc_id] = (url, title)
+                        self._url_title_cache[doc_id] = (url, title)
+            except sqlite3.Error as e:
+                logger.error("Error getting document infos in bulk: %s", e)
+
+        return infos
+
+    def get_document_id(self, url: str) -> Optional[int]:
+        """Получение ID документа по URL (через LRU кэш)"""
+        return self._get_document_id_cached(url)
+
+    @functools.lru_cache(maxsize=100_000)
+    def _get_document_id_cached(self, url: str) -> Optional[int]:
+        try:
+            self.cursor.execute('SELECT id FROM documents WHERE url = ?', (url,))
+            result = self.cursor.fetchone()
+            return result[0] if result else None
+        except sqlite3.Error as e:
+            logger.error("Error getting document ID for %s: %s", url, e)
+            return None
+
+    def add_link(self, source_doc_id: int, target_url: str, target_doc_id: Optional[int] = None):
+        """Добавление ссылки между документами"""
+        try:
+            self.cursor.execute('''
+                INSERT OR IGNORE INTO links (source_doc_id, target_url, target_doc_id)
+                VALUES (?, ?, ?)
+            ''', (source_doc_id, target_url, target_doc_id))
+
+            self._adjacency = None
+            self.graph_revision += 1
+
+        except sqlite3.Error as e:
+            logger.error("Error adding link from %s to %s: %s", source_doc_id, target_url, e)
+
+    def add_links_bulk(self, links: List[Tuple[int, str, Optional[int]]]):
+        """Пакетное добавление ссылок (source_id, target_url, target_id);
+        ошибки обрабатывает внешний транзакционный блок"""
+        self.cursor.executemany('''
+            INSERT OR IGNORE INTO links (source_doc_id, target_url, target_doc_id)
+            VALUES (?, ?, ?)
+        ''', links)
+
+        self._adjacency = None
+        self.graph_revision += 1
+
+    def add_documents_bulk(self, documents: List[Tuple[str, str, str]]) -> Dict[str, int]:
+        """Пакетное добавление документов: список (url, title, content);
+        ошибки обрабатывает внешний транзакционный блок"""
+        rows = [(url, title, content, len(content))
+                for url, title, content in documents]
+
+        self.cursor.executemany('''
+            INSERT OR IGNORE INTO documents (url, title, content, content_length)
+            VALUES (?, ?, ?, ?)
+        ''', rows)
+
+        # Возвращаем отображение url -> id
+        doc_ids = self.get_document_ids_bulk([url for url, _, _ in documents])
+        for url, title, _ in documents:
+            if url in doc_ids:
+                self._url_title_cache[doc_ids[url]] = (url, title)
+
+        self._get_document_content_cached.cache_clear()
+        self._get_document_id_cached.cache_clear()
+        return doc_ids
+
+    def add_words_bulk(self, word_counts: Dict[str, int]) -> Dict[str, int]:
+        """Пакетное добавление слов: словарь слово -> частота в документе;
+        ошибки обрабатывает внешний транзакционный блок"""
+        # Один UPSERT на уникальное слово вместо SELECT + UPDATE/INSERT
+        self.cursor.executemany('''
+            INSERT INTO words (word, frequency) VALUES (?, ?)
+            ON CONFLICT(word) DO UPDATE SET frequency = frequency + excluded.frequency
+        ''', list(word_counts.items()))
+
+        # Возвращаем отображение слово -> id (порциями по 500 из-за
+        # ограничения SQLite на число параметров)
+        words = list(word_counts.keys())
+        word_ids = {}
+        for start in range(0, len(words), 500):
+            chunk = words[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            self.cursor.execute(
+                f'SELECT word, id FROM words WHERE word IN ({placeholders})', chunk)
+            word_ids.update(self.cursor.fetchall())
+
+        self._get_word_frequency_cached.cache_clear()
+        return word_ids
+
+    def get_all_dfs(self) -> Dict[str, int]:
+        """Документные частоты всех слов одним агрегирующим запросом
+        по обратному индексу. Выводятся из фактических постингов:
+        повторная индексация того же документа их не раздувает"""
+        try:
+            self.cursor.execute('''
+                SELECT w.word, COUNT(*)
+                FROM inverted_index ii
+                JOIN words w ON w.id = ii.word_id
+                GROUP BY ii.word_id
+            ''')
+            return dict(self.cursor.fetchall())
+        except sqlite3.Error as e:
+            logger.error("Error getting document frequencies: %s", e)
+            return {}
+
+    def add_inverted_index_bulk(self, entries: List[Tuple[int, int, float, bytes]]):
+        """Пакетное добавление записей в обратный индекс:
+        список (word_id, doc_id, tf, positions_blob);
+        ошибки обрабатывает внешний транзакционный блок"""
+        self.cursor.executemany('''
+            INSERT OR REPLACE INTO inverted_index (word_id, doc_id, tf, positions)
+            VALUES (?, ?, ?, ?)
+        ''', [(word_id, doc_id, int(round(tf * FIXED_POINT_SCALE)), blob)
+              for word_id, doc_id, tf, blob in entries])
+
+        # Сбрасываем устаревшие записи горячего кэша
+        stale = {entry[0] for entry in entries} & self._hot_words
+        if stale:
+            self.cursor.executemany(
+                'DELETE FROM hot.inverted_index WHERE word_id = ?',
+                [(word_id,) for word_id in stale])
+            self._hot_words -= stale
+
+    def set_document_length(self, doc_id: int, total_terms: int):
+        """Сохранение длины документа в терминах: считается при
+        индексации, чтобы поиск не токенизировал контент заново"""
+        try:
+            self.cursor.execute('''
+                UPDATE documents SET total_terms = ? WHERE id = ?
+            ''', (total_terms, doc_id))
+
+        except sqlite3.Error as e:
+            logger.error("Error setting length for document %s: %s", doc_id, e)
+
+    def get_all_document_lengths(self) -> Dict[int, int]:
+        """Получение длин всех документов (в терминах) одним запросом"""
+        try:
+            self.cursor.execute('SELECT id, total_terms FROM documents')
+            return dict(self.cursor.fetchall())
+        except sqlite3.Error as e:
+            logger.error("Error getting document lengths: %s", e)
+            return {}
+
+    def update_pagerank(self, doc_id: int, pagerank: float, iteration: int):
+        """Обновление значения PageRank для документа"""
+        try:
+            self.cursor.execute('''
+                INSERT OR REPLACE INTO pagerank (doc_id, pagerank, iteration)
+                VALUES (?, ?, ?)
+            ''', (doc_id, int(round(pagerank * FIXED_POINT_SCALE)), iteration))
+
+        except sqlite3.Error as e:
+            logger.error("Error updating PageRank for document %s: %s", doc_id, e)
+
+    def update_pageranks_bulk(self, pageranks: Dict[int, float], iteration: int):
+        """Пакетная запись значений PageRank одним executemany"""
+        try:
+            self.cursor.executemany('''
+                INSERT OR REPLACE INTO pagerank (doc_id, pagerank, iteration)
+                VALUES (?, ?, ?)
+            ''', [(doc_id, int(round(rank * FIXED_POINT_SCALE)), iteration)
+                  for doc_id, rank in pageranks.items()])
+
+        except sqlite3.Error as e:
+            logger.error("Error updating PageRanks in bulk: %s", e)
+
+    def get_all_documents(self) -> Iterator[Tuple[int, str, str]]:
+        """Получение всех документов (ленивый генератор, порциями по 10000)"""
+        try:
+            # Отдельный курсор: потребитель может выполнять свои запросы
+            # во время итерации
+            cursor = self.conn.cursor()
+            cursor.execute('SELECT id, url, title FROM documents')
+
+            while True:
+                rows = cursor.fetchmany(10000)
+                if not rows:
+                    break
+                yield from rows
+
+        except sqlite3.Error as e:
+            logger.error("Error getting all documents: %s", e)
+
+    def get_document_content(self, doc_id: int) -> Optional[str]:
+        """Получение содержимого документа по ID (через LRU кэш)"""
+        return self._get_document_content_cached(doc_id)
+
+    @functools.lru_cache(maxsize=256)
+    def _get_document_content_cached(self, doc_id: int) -> Optional[str]:
+        try:
+            self.cursor.execute('SELECT content FROM documents WHERE id = ?', (doc_id,))
+            result = self.cursor.fetchone()
+            return result[0] if result else None
+        except sqlite3.Error as e:
+            logger.error("Error getting document content for ID %s: %s", doc_id, e)
+            return None
+
+    def get_document_url(self, doc_id: int) -> Optional[str]:
+        """Получение URL документа по ID (из кэша url/title)"""
+        info = self._url_title_cache.get(doc_id)
+        return info[0] if info else None
+
+    def get_outgoing_links(self, doc_id: int) -> List[Tuple[int, str]]:
+        """Получение исходящих ссылок документа"""
+        try:
+            self.cursor.execute('''
+                SELECT target_doc_id, target_url 
+                FROM links 
+                WHERE source_doc_id = ?
+            ''', (doc_id,))
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            logger.error("Error getting outgoing links for document %s: %s", doc_id, e)
+            return []
+
+    def get_incoming_links(self, doc_id: int) -> List[int]:
+        """Получение входящих ссылок документа"""
+        try:
+            self.cursor.execute('''
+                SELECT source_doc_id 
+                FROM links 
+                WHERE target_doc_id = ?
+            ''', (doc_id,))
+            results = self.cursor.fetchall()
+            return [row[0] for row in results] if results else []
+        except sqlite3.Error as e:
+            logger.error("Error getting incoming links for document %s: %s", doc_id, e)
+            return []
+
+    def get_all_links(self) -> List[Tuple[int, int]]:
+        """Получение всех ребер графа (source_id, target_id) одним запросом"""
+        try:
+            self.cursor.execute('''
+                SELECT source_doc_id, target_doc_id
+                FROM links
+                WHERE target_doc_id IS NOT NULL
+            ''')
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            logger.error("Error getting all links: %s", e)
+            return []
+
+    def get_full_adjacency(self) -> Dict[int, List[int]]:
+        """Получение всего графа входящих ссылок одним запросом:
+        doc_id -> список документов, ссылающихся на него"""
+        if self._adjacency is not None:
+            return self._adjacency
+
+        try:
+            self.cursor.execute('''
+                SELECT source_doc_id, target_doc_id
+                FROM links
+                WHERE target_doc_id IS NOT NULL
+                ORDER BY target_doc_id
+            ''')
+            self._adjacency = {
+                target: [source for source, _ in group]
+                for target, group in itertools.groupby(
+                    self.cursor.fetchall(), key=lambda row: row[1])
+            }
+            return self._adjacency
+
+        except sqlite3.Error as e:
+            logger.error("Error getting full adjacency: %s", e)
+            return {}
+
+    def get_all_postings(self) -> Dict[str, List[Tuple[int, float]]]:
+        """Выгрузка всего обратного индекса одним запросом:
+        word -> [(doc_id, tf), ...]"""
+        try:
+            self.cursor.execute('''
+                SELECT w.word, ii.doc_id, ii.tf
+                FROM inverted_index ii
+                JOIN words w ON w.id = ii.word_id
+                ORDER BY ii.word_id
+            ''')
+            postings: Dict[str, List[Tuple[int, float]]] = {}
+            for word, doc_id, tf in self.cursor:
+                postings.setdefault(word, []).append(
+                    (doc_id, tf / FIXED_POINT_SCALE))
+            return postings
+
+        except sqlite3.Error as e:
+            logger.error("Error loading all postings: %s", e)
+            return {}
+
+    def get_documents_for_word(self, word: str) -> List[Tuple[int, float]]:
+        """Получение документов, содержащих слово"""
+        try:
+            # Двухшаговая выборка: точечный поиск id слова, затем чтение
+            # doc_id/tf напрямую из покрывающего индекса idx_inverted_word
+            self.cursor.execute('SELECT id FROM words WHERE word = ?', (word,))
+            result = self.cursor.fetchone()
+            if not result:
+                return []
+
+            word_id = result[0]
+
+            # Быстрый путь: записи уже в горячей in-memory таблице
+            if word_id not in self._hot_words:
+                # Грубое вытеснение: при переполнении сбрасываем весь кэш
+                if len(self._hot_words) >= 10000:
+                    self.cursor.execute('DELETE FROM hot.inverted_index')
+                    self._hot_words.clear()
+
+                self.cursor.execute('''
+                    INSERT INTO hot.inverted_index (word_id, doc_id, tf)
+                    SELECT word_id, doc_id, tf FROM inverted_index WHERE word_id = ?
+                ''', (word_id,))
+                self._hot_words.add(word_id)
+
+            self.cursor.execute('''
+                SELECT doc_id, tf
+                FROM hot.inverted_index
+                WHERE word_id = ?
+            ''', (word_id,))
+            results = self.cursor.fetchall()
+
+            # Преобразуем результаты: tf хранится как абсолютная частота
+            formatted_results = []
+            for doc_id, tf in results:
+                formatted_results.append((doc_id, tf / FIXED_POINT_SCALE))
+
+            return formatted_results
+
+        except sqlite3.Error as e:
+            logger.error("Error getting documents for word %s: %s", word, e)
+            return []
+
+    def get_word_frequency(self, word: str) -> int:
+        """Получение частоты слова (через LRU кэш)"""
+        return self._get_word_frequency_cached(word)
+
+    @functools.lru_cache(maxsize=100_000)
+    def _get_word_frequency_cached(self, word: str) -> int:
+        try:
+            self.cursor.execute('SELECT frequency FROM words WHERE word = ?', (word,))
+            result = self.cursor.fetchone()
+            return result[0] if result else 0
+        except sqlite3.Error as e:
+            logger.error("Error getting frequency for word %s: %s", word, e)
+            return 0
+
+    def get_total_documents(self) -> int:
+        """Получение общего количества документов"""
+        try:
+            self.cursor.execute('SELECT COUNT(*) FROM documents')
+            result = self.cursor.fetchone()
+            return result[0] if result else 0
+        except sqlite3.Error as e:
+            logger.error("Error getting total documents count: %s", e)
+            return 0
+
+    def get_pagerank(self, doc_id: int) -> float:
+        """Получение значения PageRank для документа"""
+        try:
+            self.cursor.execute('SELECT pagerank FROM pagerank WHERE doc_id = ?', (doc_id,))
+            result = self.cursor.fetchone()
+            return result[0] / FIXED_POINT_SCALE if result else 1.0
+        except sqlite3.Error as e:
+            logger.error("Error getting PageRank for document %s: %s", doc_id, e)
+            return 1.0
+
+    def get_all_pageranks(self) -> Dict[int, float]:
+        """Получение всех значений PageRank"""
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute('SELECT doc_id, pagerank FROM pagerank')
+
+            # Наполняем словарь порциями, не материализуя список кортежей
+            pageranks = {}
+            while True:
+                rows = cursor.fetchmany(10000)
+                if not rows:
+                    break
+                pageranks.update(
+                    (doc_id, quantized / FIXED_POINT_SCALE) for doc_id, quantized in rows)
+
+            return pageranks
+        except sqlite3.Error as e:
+            logger.error("Error getting all PageRanks: %s", e)
+            return {}
+
+    def get_all_pageranks_np(self) -> Tuple[Any, Any]:
+        """Получение всех значений PageRank парой numpy массивов
+        (doc_ids: int64, ranks: float32) без словаря Python-объектов"""
+        import numpy as np
+
+        try:
+            self.cursor.execute('SELECT COUNT(*) FROM pagerank')
+            n = self.cursor.fetchone()[0]
+
+            self.cursor.execute('SELECT doc_id, pagerank FROM pagerank')
+            rows = self.cursor.fetchall()
+
+            doc_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=n)
+            ranks = np.fromiter((row[1] for row in rows), dtype=np.float32, count=n)
+            ranks /= FIXED_POINT_SCALE
+            return doc_ids, ranks
+
+        except sqlite3.Error as e:
+            logger.error("Error getting all PageRanks as arrays: %s", e)
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    def pagerank_compute(self, damping_factor: float = 0.85, tolerance: float = 1e-6,
+                         max_iterations: int = 100) -> Dict[int, float]:
+        """Векторизованный расчет PageRank: одна загрузка графа ссылок
+        в CSR массивы и степенная итерация через ядро pagerank_kernel
+        вместо SQL-запросов на каждый документ"""
+        import numpy as np
+        from pagerank_kernel import pr_step
+
+        try:
+            self.cursor.execute('SELECT id FROM documents')
+            doc_ids = [row[0] for row in self.cursor.fetchall()]
+            n = len(doc_ids)
+            if n == 0:
+                return {}
+
+            id_to_index = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+
+            # Одна выборка всего графа ссылок
+            self.cursor.execute('''
+                SELECT source_doc_id, target_doc_id
+                FROM links
+                WHERE target_doc_id IS NOT NULL
+            ''')
+            edges = [(id_to_index[src], id_to_index[tgt])
+                     for src, tgt in self.cursor.fetchall()
+                     if src in id_to_index and tgt in id_to_index]
+
+            # CSR по входящим ссылкам: для вершины v — срез источников
+            # indices[indptr[v]:indptr[v+1]]
+            if edges:
+                src = np.array([e[0] for e in edges], dtype=np.int64)
+                tgt = np.array([e[1] for e in edges], dtype=np.int64)
+
+                order = np.argsort(tgt, kind='stable')
+                indices = src[order]
+                indptr = np.zeros(n + 1, dtype=np.int64)
+                indptr[1:] = np.cumsum(np.bincount(tgt, minlength=n))
+
+                out_degree = np.bincount(src, minlength=n).astype(np.float64)
+                # where=: без вычисления 1/0 для висячих вершин
+                inv_out_degree = np.divide(
+                    1.0, out_degree, out=np.zeros_like(out_degree),
+                    where=out_degree > 0)
+            else:
+                indices = np.empty(0, dtype=np.int64)
+                indptr = np.zeros(n + 1, dtype=np.int64)
+                inv_out_degree = np.zeros(n, dtype=np.float64)
+
+            # Степенная итерация: pr = (1-d)/N + d * M @ pr
+            pr = np.full(n, 1.0 / n)
+            new_pr = np.empty_like(pr)
+            teleport = (1.0 - damping_factor) / n
+            iteration = 0
+
+            for iteration in range(1, max_iterations + 1):
+                pr_step(indptr, indices, inv_out_degree, pr, new_pr,
+                        damping_factor, teleport)
+                if np.linalg.norm(new_pr - pr, 1) < tolerance:
+                    pr, new_pr = new_pr, pr
+                    break
+                pr, new_pr = new_pr, pr
+
+            # Запись результата одним executemany
+            self.cursor.executemany('''
+                INSERT OR REPLACE INTO pagerank (doc_id, pagerank, iteration)
+                VALUES (?, ?, ?)
+            ''', [(doc_id, int(round(float(pr[i]) * FIXED_POINT_SCALE)), iteration)
+                  for doc_id, i in id_to_index.items()])
+
+            logger.info("In-memory PageRank computed in %s iterations", iteration)
+            return {doc_id: float(pr[i]) for doc_id, i in id_to_index.items()}
+
+        except sqlite3.Error as e:
+            logger.error("Error computing PageRank in memory: %s", e)
+            return {}
+
+    def get_document_info(self, doc_id: int) -> Optional[Tuple[str, str]]:
+        """Получение информации о документе (из кэша url/title)"""
+        return self._url_title_cache.get(doc_id)
+
+    def clear_database(self):
+        """Очистка базы данных (для тестирования)"""
+        try:
+            tables = ['documents', 'words', 'links', 'inverted_index', 'pagerank']
+            for table in tables:
+                self.cursor.execute(f'DELETE FROM {table}')
+
+            self.cursor.execute('DELETE FROM sqlite_sequence')
+            self.cursor.execute('DELETE FROM hot.inverted_index')
+
+            self._hot_words.clear()
+            self._url_title_cache.clear()
+            self.graph_revision += 1
+            self._csr_cache.clear()
+            self._get_document_content_cached.cache_clear()
+            self._get_document_id_cached.cache_clear()
+            self._get_word_frequency_cached.cache_clear()
+            logger.info("Database cleared successfully")
+
+        except sqlite3.Error as e:
+            logger.error("Error clearing database: %s", e)
+
+    def close(self):
+        """Закрытие соединения с базой данных"""
+        if self.conn:
+            self.conn.close()
+            logger.info("Database connection closed")
\ No newline at end of file
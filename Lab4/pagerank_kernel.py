@@ -0,0 +1,36 @@
+"""
+Ядро степенной итерации PageRank над CSR массивами
+
+При наличии numba цикл компилируется в машинный код (LLVM, SIMD,
+параллельно по вершинам); иначе используется эквивалентная
+векторизованная numpy-реализация.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def pr_step(indptr, indices, inv_out_degree, pr_old, pr_new, damping, base):
+        """Один шаг pull-итерации: pr_new[v] = base + d * sum(pr_old[u] / out(u))"""
+        for v in prange(len(pr_new)):
+            acc = 0.0
+            for k in range(indptr[v], indptr[v + 1]):
+                u = indices[k]
+                acc += pr_old[u] * inv_out_degree[u]
+            pr_new[v] = base + damping * acc
+else:
+    def pr_step(indptr, indices, inv_out_degree, pr_old, pr_new, damping, base):
+        """Один шаг pull-итерации: pr_new[v] = base + d * sum(pr_old[u] / out(u))"""
+        contributions = pr_old[indices] * inv_out_degree[indices]
+
+        # Посегментное суммирование CSR через кумулятивную сумму
+        # (устойчиво к пустым строкам, в отличие от np.add.reduceat)
+        cumulative = np.concatenate(([0.0], np.cumsum(contributions)))
+        pr_new[:] = base + damping * (cumulative[indptr[1:]] - cumulative[indptr[:-1]])
@@ -1,175 +1,419 @@
-"""
-Реализация PageRank с использованием MapReduce парадигмы
-"""
-
-import sqlite3
-from typing import List, Dict, Tuple, Any
-import logging
-from database import Database
-from config import PAGERANK_CONFIG
-from utils import logger
-
-
-class PageRankMapReduce:
-    """Класс для вычисления PageRank с использованием MapReduce"""
-
-    def __init__(self, db: Database):
-        self.db = db
-        self.damping_factor = PAGERANK_CONFIG['damping_factor']
-        self.max_iterations = PAGERANK_CONFIG['max_iterations']
-        self.tolerance = PAGERANK_CONFIG['tolerance']
-
-        # Получение информации о документах
-        self.documents = self.db.get_all_documents()
-        self.doc_ids = [doc[0] for doc in self.documents]
-        self.num_documents = len(self.doc_ids)
-
-        # Инициализация PageRank
-        self.pagerank = {doc_id: 1.0 / self.num_documents for doc_id in self.doc_ids}
-
-        # Построение графа ссылок
-        self.outgoing_links = {}
-        self.incoming_links = {}
-
-        for doc_id in self.doc_ids:
-            outgoing = self.db.get_outgoing_links(doc_id)
-            self.outgoing_links[doc_id] = [link[0] for link in outgoing if link[0]]
-
-            incoming = self.db.get_incoming_links(doc_id)
-            self.incoming_links[doc_id] = incoming
-
-        logger.info(f"PageRankMapReduce initialized for {self.num_documents} documents")
-
-    def map_phase(self, doc_id: int, pagerank: float) -> List[Tuple[int, float]]:
-        """
-        Map фаза: распределение PageRank по исходящим ссылкам
-        """
-        if doc_id not in self.outgoing_links:
-            return []
-
-        outgoing = self.outgoing_links[doc_id]
-        if not outgoing:
-            return []
-
-        # Равномерное распределение PageRank
-        share = pagerank / len(outgoing)
-
-        # Возвращаем пары (целевой документ, доля PageRank)
-        return [(target_id, share) for target_id in outgoing]
-
-    def reduce_phase(self, contributions: List[Tuple[int, float]]) -> Dict[int, float]:
-        """
-        Reduce фаза: суммирование входящих PageRank
-        """
-        reduced = {}
-        for doc_id, contribution in contributions:
-            reduced[doc_id] = reduced.get(doc_id, 0.0) + contribution
-
-        return reduced
-
-    def calculate_pagerank_iteration(self, current_pagerank: Dict[int, float]) -> Dict[int, float]:
-        """
-        Вычисление одной итерации PageRank
-        """
-        # Map фаза: сбор всех contributions
-        all_contributions = []
-        for doc_id, rank in current_pagerank.items():
-            contributions = self.map_phase(doc_id, rank)
-            all_contributions.extend(contributions)
-
-        # Reduce фаза: суммирование contributions
-        new_ranks = self.reduce_phase(all_contributions)
-
-        # Применение формулы PageRank
-        for doc_id in self.doc_ids:
-            # Базовая часть (для документов без входящих ссылок)
-            base_rank = (1 - self.damping_factor) / self.num_documents
-
-            # Часть от входящих ссылок
-            incoming_rank = new_ranks.get(doc_id, 0.0) * self.damping_factor
-
-            # Суммирование
-            new_ranks[doc_id] = base_rank + incoming_rank
-
-        return new_ranks
-
-    def calculate(self) -> Dict[int, float]:
-        """
-        Основной метод вычисления PageRank
-        """
-        logger.info("Starting PageRank calculation using MapReduce")
-
-        current_pagerank = self.pagerank.copy()
-
-        for iteration in range(self.max_iterations):
-            # Вычисление новой итерации
-            new_pagerank = self.calculate_pagerank_iteration(current_pagerank)
-
-            # Проверка сходимости
-            convergence = self.calculate_convergence(current_pagerank, new_pagerank)
-
-            # Обновление текущих значений
-            current_pagerank = new_pagerank
-
-            # Сохранение в базу данных
-            for doc_id, rank in current_pagerank.items():
-                self.db.update_pagerank(doc_id, rank, iteration + 1)
-
-            logger.info(f"Iteration {iteration + 1}: Convergence = {convergence:.6f}")
-
-            # Проверка условия остановки
-            if convergence < self.tolerance:
-                logger.info(f"PageRank converged after {iteration + 1} iterations")
-                break
-
-        self.pagerank = current_pagerank
-        return self.pagerank
-
-    def calculate_convergence(self, old_ranks: Dict[int, float],
-                              new_ranks: Dict[int, float]) -> float:
-        """
-        Вычисление сходимости (среднеквадратичная ошибка)
-        """
-        total_diff = 0.0
-        for doc_id in self.doc_ids:
-            diff = new_ranks.get(doc_id, 0.0) - old_ranks.get(doc_id, 0.0)
-            total_diff += diff * diff
-
-        return (total_diff / self.num_documents) ** 0.5
-
-    def get_top_documents(self, n: int = 10) -> List[Tuple[int, float, str]]:
-        """
-        Получение топ-N документов по PageRank
-        """
-        # Получение информации о документах
-        documents_info = {}
-        for doc_id, url, title in self.documents:
-            documents_info[doc_id] = (url, title)
-
-        # Сортировка по PageRank
-        sorted_docs = sorted(self.pagerank.items(),
-                             key=lambda x: x[1],
-                             reverse=True)[:n]
-
-        # Формирование результата
-        result = []
-        for doc_id, rank in sorted_docs:
-            url, title = documents_info.get(doc_id, ("Unknown", "Unknown"))
-            result.append((doc_id, rank, url, title[:50]))
-
-        return result
-
-    def print_statistics(self):
-        """Вывод статистики PageRank"""
-        print("\n=== PageRank Statistics (MapReduce) ===")
-        print(f"Total documents: {self.num_documents}")
-        print(f"Damping factor: {self.damping_factor}")
-        print(f"Max iterations: {self.max_iterations}")
-
-        top_docs = self.get_top_documents(5)
-        print("\nTop 5 documents by PageRank:")
-        for doc_id, rank, url, title in top_docs:
-            print(f"  ID: {doc_id}, Rank: {rank:.6f}")
-            print(f"  URL: {url}")
-            print(f"  Title: {title}")
-            print()
\ No newline at end of file
+"""
+Реализация PageRank с использованием MapReduce парадигмы
+"""
+
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from typing import List, Dict, Tuple, Any, Iterable, Iterator
+import logging
+import numpy as np
+from database import Database
+from config import PAGERANK_CONFIG
+from utils import logger
+from pagerank_kernel import pr_step
+
+try:
+    from scipy.sparse import csr_matrix
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+# Минимальный размер графа, с которого блочный SpMV по потокам окупается;
+# на малых графах один вызов scipy быстрее накладных расходов пула
+PARALLEL_SPMV_MIN_DOCS = 50_000
+
+# Максимальный размер графа, для которого итерация разворачивается в
+# сгенерированный код без циклов (частичная специализация по N)
+UNROLL_MAX_DOCS = 256
+
+
+class PageRankMapReduce:
+    """Класс для вычисления PageRank с использованием MapReduce"""
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.damping_factor = PAGERANK_CONFIG['damping_factor']
+        self.max_iterations = PAGERANK_CONFIG['max_iterations']
+        self.tolerance = PAGERANK_CONFIG['tolerance']
+
+        # Получение информации о документах (генератор материализуем:
+        # список переиспользуется в get_top_documents)
+        self.documents = list(self.db.get_all_documents())
+        self.doc_ids = [doc[0] for doc in self.documents]
+        self.num_documents = len(self.doc_ids)
+
+        # Отображение ID документа -> плотный индекс вектора
+        self.id2idx = {doc_id: i for i, doc_id in enumerate(self.doc_ids)}
+
+        # CSR-структуры переиспользуются между инстансами через кэш на
+        # Database: ключ — (ревизия графа, N), инвалидация по add_link
+        cache_key = (self.db.graph_revision, self.num_documents)
+        cached = self.db._csr_cache.get(cache_key)
+        if cached is not None:
+            (self.out_deg, self.indptr, self.indices,
+             self.in_indptr, self.in_indices, self.inv_out_degree) = cached
+        else:
+            # Построение графа ссылок: все ребра одним запросом вместо
+            # 2N обращений к базе, сразу в плотные индексы
+            src_list = []
+            dst_list = []
+            for source_id, target_id in self.db.get_all_links():
+                if source_id in self.id2idx and target_id in self.id2idx:
+                    src_list.append(self.id2idx[source_id])
+                    dst_list.append(self.id2idx[target_id])
+
+            n = max(self.num_documents, 1)
+            src_idx = np.asarray(src_list, dtype=np.int32)
+            dst_idx = np.asarray(dst_list, dtype=np.int32)
+
+            # Исходящие степени
+            self.out_deg = np.bincount(src_idx, minlength=n)[:self.num_documents]
+
+            # CSR исходящих ребер: indptr/indices — непрерывные массивы,
+            # горячий цикл читает их последовательно, без хэш-поисков
+            self.indices = dst_idx[np.argsort(src_idx, kind='stable')]
+            self.indptr = np.concatenate(
+                ([0], np.cumsum(np.bincount(src_idx, minlength=n)[:self.num_documents]))
+            ).astype(np.int32)
+
+            # CSR входящих ребер для скалярного ядра (pr_step)
+            self.in_indices = src_idx[np.argsort(dst_idx, kind='stable')]
+            self.in_indptr = np.concatenate(
+                ([0], np.cumsum(np.bincount(dst_idx, minlength=n)[:self.num_documents]))
+            ).astype(np.int32)
+            # float32: точности хватает для tolerance ~1e-6, а байт на
+            # итерацию (и нагрузка на память в SpMV) вдвое меньше float64
+            # np.divide с where не трогает висячие вершины, поэтому не
+            # сыплет RuntimeWarning о делении на ноль
+            self.inv_out_degree = np.divide(
+                1.0, self.out_deg,
+                out=np.zeros(self.num_documents, dtype=np.float64),
+                where=self.out_deg > 0).astype(np.float32)
+
+            # Кэш хранит только актуальную ревизию
+            self.db._csr_cache = {
+                cache_key: (self.out_deg, self.indptr, self.indices,
+                            self.in_indptr, self.in_indices,
+                            self.inv_out_degree)}
+
+        # Висячие вершины (без исходящих ссылок): их масса
+        # перераспределяется равномерно, иначе PageRank утекает
+        self.dangling_mask = self.out_deg == 0
+
+        # Константы, не меняющиеся между итерациями: телепорт-слагаемое
+        # и исходящие степени по ID (для словарных путей)
+        self._teleport = ((1.0 - self.damping_factor) / self.num_documents
+                          if self.num_documents else 0.0)
+        self._out_deg_by_id = {doc_id: int(self.out_deg[i])
+                               for doc_id, i in self.id2idx.items()}
+
+        # Для малых графов итерация компилируется один раз в развернутый
+        # код: прямые выражения по фиксированной смежности, без циклов
+        # и индексных массивов
+        if 0 < self.num_documents <= UNROLL_MAX_DOCS:
+            self._unrolled = self._build_unrolled_kernel()
+        else:
+            self._unrolled = None
+
+        if SCIPY_AVAILABLE and self.num_documents > 0:
+            # Матрица смежности собирается прямо из готового CSR;
+            # итерация делается через транспонированную матрицу (pull-вариант)
+            adjacency = csr_matrix(
+                (np.ones(len(self.indices), dtype=np.float32),
+                 self.indices, self.indptr),
+                shape=(self.num_documents, self.num_documents))
+            self.At = adjacency.T.tocsr()
+        else:
+            self.At = None
+
+        # Параллельный SpMV: матрица режется на блоки строк,
+        # по блоку на рабочий поток (NumPy/scipy отпускают GIL)
+        self._spmv_blocks = None
+        self._spmv_pool = None
+        n_workers = os.cpu_count() or 1
+        if (self.At is not None and n_workers > 1
+                and self.num_documents >= PARALLEL_SPMV_MIN_DOCS):
+            bounds = np.linspace(0, self.num_documents, n_workers + 1,
+                                 dtype=np.int64)
+            self._spmv_blocks = [
+                (int(bounds[k]), int(bounds[k + 1]),
+                 self.At[int(bounds[k]):int(bounds[k + 1])])
+                for k in range(n_workers)
+                if bounds[k + 1] > bounds[k]]
+            self._spmv_pool = ThreadPoolExecutor(max_workers=n_workers)
+
+        # Инициализация PageRank (плотный вектор float32)
+        if self.num_documents > 0:
+            self.pagerank = np.full(self.num_documents,
+                                    1.0 / self.num_documents, dtype=np.float32)
+        else:
+            self.pagerank = np.empty(0, dtype=np.float32)
+
+        # Два рабочих буфера и scratch-вектор: итерации пишут в них
+        # попеременно, внутри цикла аллокаций нет
+        self._buf_a = np.empty_like(self.pagerank)
+        self._buf_b = np.empty_like(self.pagerank)
+        self._scaled = np.empty_like(self.pagerank)
+
+        logger.info(f"PageRankMapReduce initialized for {self.num_documents} documents")
+
+    @cached_property
+    def outgoing_links(self) -> Dict[int, List[int]]:
+        """Совместимое словарное представление исходящих ссылок
+        (строится из CSR при первом обращении)"""
+        return {
+            doc_id: [self.doc_ids[j] for j in
+                     self.indices[self.indptr[i]:self.indptr[i + 1]]]
+            for doc_id, i in self.id2idx.items()}
+
+    @cached_property
+    def incoming_links(self) -> Dict[int, List[int]]:
+        """Совместимое словарное представление входящих ссылок
+        (строится из CSR при первом обращении)"""
+        return {
+            doc_id: [self.doc_ids[j] for j in
+                     self.in_indices[self.in_indptr[i]:self.in_indptr[i + 1]]]
+            for doc_id, i in self.id2idx.items()}
+
+    def _build_unrolled_kernel(self):
+        """Генерация развернутого ядра итерации, специализированного
+        на текущий граф: обратные степени вшиты константами"""
+        lines = ['def _pr_unrolled(pr, new, base, d):']
+        for i in range(self.num_documents):
+            terms = [
+                'pr[%d] * %r' % (j, float(self.inv_out_degree[j]))
+                for j in self.in_indices[self.in_indptr[i]:self.in_indptr[i + 1]]]
+            expr = ' + '.join(terms) if terms else '0.0'
+            lines.append('    new[%d] = base + d * (%s)' % (i, expr))
+        namespace = {}
+        exec(compile('\n'.join(lines), '<pr-unrolled>', 'exec'), namespace)
+        return namespace['_pr_unrolled']
+
+    def _spmv_block(self, start: int, end: int, block, out: np.ndarray):
+        """Частичный SpMV: блок строк At умножается на scratch-вектор"""
+        out[start:end] = block @ self._scaled
+
+    def map_phase(self, doc_id: int, pagerank: float) -> Iterator[Tuple[int, float]]:
+        """
+        Map фаза: распределение PageRank по исходящим ссылкам.
+        Генератор: пары (цель, доля) не материализуются списком,
+        в памяти живет одна пара за раз
+        """
+        degree = self._out_deg_by_id.get(doc_id, 0)
+        if not degree:
+            return
+
+        # Равномерное распределение PageRank (степень предвычислена)
+        share = pagerank / degree
+
+        # Отдаем пары (целевой документ, доля PageRank) по одной
+        for target_id in self.outgoing_links[doc_id]:
+            yield target_id, share
+
+    def reduce_phase(self, contributions: Iterable[Tuple[int, float]]) -> Dict[int, float]:
+        """
+        Reduce фаза: суммирование входящих PageRank; принимает любой
+        итерируемый источник пар, включая генераторы map-фазы
+        """
+        reduced = {}
+        for doc_id, contribution in contributions:
+            reduced[doc_id] = reduced.get(doc_id, 0.0) + contribution
+
+        return reduced
+
+    def map_reduce_phase(self, current_ranks: Dict[int, float]) -> Dict[int, float]:
+        """
+        Слитые map+reduce: один проход по ребрам с накоплением долей
+        прямо в итоговый словарь, без материализации пар (цель, доля).
+        Заменяет цепочку map_phase -> reduce_phase для словарного пути
+        """
+        new_ranks = dict.fromkeys(self.doc_ids, 0.0)
+        dangling_sum = 0.0
+
+        for doc_id, rank in current_ranks.items():
+            degree = self._out_deg_by_id.get(doc_id, 0)
+            if not degree:
+                dangling_sum += rank
+                continue
+            share = rank / degree
+            for target_id in self.outgoing_links[doc_id]:
+                new_ranks[target_id] += share
+
+        # Демпфирование и телепорт вторым проходом по вершинам
+        base_rank = (self._teleport
+                     + self.damping_factor * dangling_sum / self.num_documents)
+        for doc_id in new_ranks:
+            new_ranks[doc_id] = (base_rank
+                                 + self.damping_factor * new_ranks[doc_id])
+
+        return new_ranks
+
+    def calculate_pagerank_iteration(self, current_pagerank: np.ndarray,
+                                     out: np.ndarray = None) -> np.ndarray:
+        """
+        Вычисление одной итерации PageRank над плотным вектором;
+        результат пишется в out (если передан) без новых аллокаций
+        """
+        if out is None:
+            out = np.empty_like(current_pagerank)
+
+        # Базовая часть + равномерно перераспределенная масса висячих вершин
+        dangling_sum = float(current_pagerank[self.dangling_mask].sum())
+        base_rank = (self._teleport
+                     + self.damping_factor * dangling_sum / self.num_documents)
+
+        if self._unrolled is not None:
+            # Малый граф: сгенерированное развернутое ядро, интерпретатор
+            # выполняет прямолинейный код без циклов
+            self._unrolled(current_pagerank, out, base_rank,
+                           self.damping_factor)
+            return out
+
+        if self.At is not None:
+            # Векторизованный путь: вся итерация — одно разреженное
+            # матрично-векторное произведение (деление заменено умножением
+            # на заранее посчитанные обратные степени, все в float32)
+            np.multiply(current_pagerank, self.inv_out_degree, out=self._scaled)
+            if self._spmv_pool is not None:
+                # Большой граф: блоки строк умножаются параллельно,
+                # барьер — ожидание всех futures в конце итерации
+                futures = [
+                    self._spmv_pool.submit(self._spmv_block, start, end,
+                                           block, out)
+                    for start, end, block in self._spmv_blocks]
+                for future in futures:
+                    future.result()
+                np.multiply(out, self.damping_factor, out=out)
+            else:
+                np.multiply(self.At @ self._scaled, self.damping_factor,
+                            out=out)
+            out += base_rank
+            return out
+
+        # Запасной путь без scipy: общее pull-ядро из pagerank_kernel
+        # (JIT через Numba при наличии, иначе NumPy)
+        pr_step(self.in_indptr, self.in_indices, self.inv_out_degree,
+                current_pagerank, out, self.damping_factor, base_rank)
+        return out
+
+    def calculate(self, checkpoint_every: int = 0) -> Dict[int, float]:
+        """
+        Основной метод вычисления PageRank
+
+        checkpoint_every > 0 включает промежуточную запись в базу каждые
+        N итераций; по умолчанию сохраняется только финальный вектор
+        """
+        logger.info("Starting PageRank calculation using MapReduce")
+
+        # Тривиальные случаи: результат известен без итераций
+        if self.num_documents == 0:
+            return {}
+        if self.num_documents == 1:
+            only_id = self.doc_ids[0]
+            self.pagerank = np.ones(1, dtype=np.float32)
+            self.db.update_pagerank(only_id, 1.0, 0)
+            return {only_id: 1.0}
+        if self.damping_factor == 0:
+            # Без демпфирования ранг каждой вершины — чистый телепорт 1/N
+            self.pagerank = np.full(self.num_documents,
+                                    1.0 / self.num_documents, dtype=np.float32)
+            result = {doc_id: 1.0 / self.num_documents
+                      for doc_id in self.doc_ids}
+            self.db.update_pageranks_bulk(result, 0)
+            return result
+
+        # Буферы переключаются попеременно, без копий внутри цикла
+        current_pagerank, next_pagerank = self._buf_a, self._buf_b
+        current_pagerank[:] = self.pagerank
+        iteration = 0
+
+        for iteration in range(self.max_iterations):
+            # Вычисление новой итерации (в свободный буфер)
+            self.calculate_pagerank_iteration(current_pagerank, out=next_pagerank)
+
+            # Проверка сходимости
+            convergence = self.calculate_convergence(current_pagerank, next_pagerank)
+
+            # Обновление текущих значений (обмен буферов)
+            current_pagerank, next_pagerank = next_pagerank, current_pagerank
+
+            # Промежуточное сохранение (только по запросу)
+            if checkpoint_every and (iteration + 1) % checkpoint_every == 0:
+                self.db.update_pageranks_bulk(
+                    {doc_id: float(current_pagerank[i])
+                     for doc_id, i in self.id2idx.items()},
+                    iteration + 1)
+
+            # Ленивое форматирование: строка не собирается, если логи
+            # этого уровня выключены
+            logger.info("Iteration %d: Convergence = %.6f",
+                        iteration + 1, convergence)
+
+            # Проверка условия остановки
+            if convergence < self.tolerance:
+                logger.info("PageRank converged after %d iterations",
+                            iteration + 1)
+                break
+
+        # Копия: self.pagerank не должен делить память с рабочим буфером
+        self.pagerank = current_pagerank.copy()
+
+        # Словарь возвращаем только на границе API
+        result = {doc_id: float(current_pagerank[i]) for doc_id, i in self.id2idx.items()}
+
+        # Одна пакетная запись финального вектора вместо N записей на итерацию
+        self.db.update_pageranks_bulk(result, iteration + 1)
+
+        return result
+
+    def calculate_convergence(self, old_ranks: np.ndarray,
+                              new_ranks: np.ndarray) -> float:
+        """
+        Вычисление сходимости: L1-норма разности векторов —
+        стандартный критерий остановки PageRank; tolerance
+        сравнивается с суммой абсолютных изменений
+        """
+        return float(np.abs(new_ranks - old_ranks).sum())
+
+    def get_top_documents(self, n: int = 10) -> List[Tuple[int, float, str]]:
+        """
+        Получение топ-N документов по PageRank
+        """
+        # Получение информации о документах
+        documents_info = {}
+        for doc_id, url, title in self.documents:
+            documents_info[doc_id] = (url, title)
+
+        # Частичный отбор топ-N через argpartition (O(N) вместо полной
+        # сортировки), затем сортируются только n выбранных элементов
+        n_top = min(n, self.num_documents)
+        if n_top == 0:
+            return []
+        top_idx = np.argpartition(-self.pagerank, n_top - 1)[:n_top]
+        top_idx = top_idx[np.argsort(-self.pagerank[top_idx])]
+
+        # Формирование результата
+        result = []
+        for i in top_idx:
+            doc_id = self.doc_ids[int(i)]
+            url, title = documents_info.get(doc_id, ("Unknown", "Unknown"))
+            result.append((doc_id, float(self.pagerank[i]), url, title[:50]))
+
+        return result
+
+    def print_statistics(self):
+        """Вывод статистики PageRank"""
+        print("\n=== PageRank Statistics (MapReduce) ===")
+        print(f"Total documents: {self.num_documents}")
+        print(f"Damping factor: {self.damping_factor}")
+        print(f"Max iterations: {self.max_iterations}")
+
+        top_docs = self.get_top_documents(5)
+        print("\nTop 5 documents by PageRank:")
+        for doc_id, rank, url, title in top_docs:
+            print(f"  ID: {doc_id}, Rank: {rank:.6f}")
+            print(f"  URL: {url}")
+            print(f"  Title: {title}")
+            print()
@@ -3,95 +3,108 @@
 Реализация PageRank с использованием упрощенного Pregel-like подхода
 """
 
+import heapq
+import operator
 from typing import List, Dict, Tuple, Any
 import logging
+import numpy as np
 from database import Database
 from config import PAGERANK_CONFIG
 from utils import logger
+from pagerank_kernel import pr_step
 
+try:
+    from scipy.sparse import csr_matrix
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
 
-class PregelVertex:
-    """Вершина графа для упрощенной Pregel реализации"""
+try:
+    import cupy as cp
+    from cupyx.scipy.sparse import csr_matrix as cp_csr_matrix
+    CUPY_AVAILABLE = True
+except ImportError:
+    CUPY_AVAILABLE = False
 
-    def __init__(self, vertex_id: int):
-        self.id = vertex_id
-        self.value = 0.0  # Текущее значение PageRank
-        self.outgoing_edges = []  # Исходящие ребра
-        self.active = True
-
-    def send_messages(self) -> List[Tuple[int, float]]:
-        """
-        Отправка сообщений соседям
-        """
-        if not self.outgoing_edges:
-            return []
-
-        # Равномерное распределение PageRank по исходящим ссылкам
-        share = self.value / len(self.outgoing_edges)
-        return [(neighbor, share) for neighbor in self.outgoing_edges]
+# SpMV ограничена пропускной способностью памяти, поэтому GPU
+# окупается только на графах, где пересылка на устройство
+# амортизируется числом итераций
+GPU_MIN_DOCS = 100_000
 
 
 class SimplePregelGraph:
-    """Упрощенный граф для Pregel-like реализации PageRank"""
+    """Упрощенный граф для Pregel-like реализации PageRank.
+    SoA-раскладка: вместо списка объектов-вершин — плотные массивы
+    значений и флагов активности плюс CSR исходящих ребер"""
 
     def __init__(self, num_vertices: int):
-        self.vertices = [PregelVertex(i) for i in range(num_vertices)]
         self.num_vertices = num_vertices
         self.superstep = 0
-        self.messages = {}
+        self.value = np.zeros(num_vertices, dtype=np.float64)
+        self.active = np.ones(num_vertices, dtype=np.bool_)
+        self.n_active = num_vertices
+        # Ребра накапливаются списком, CSR собирается в finalize()
+        self._edges: List[Tuple[int, int]] = []
+        self.indptr = None
+        self.indices = None
 
     def add_edge(self, source: int, target: int):
         """Добавление ребра в граф"""
         if 0 <= source < self.num_vertices and 0 <= target < self.num_vertices:
-            self.vertices[source].outgoing_edges.append(target)
+            self._edges.append((source, target))
+            # CSR пересобирается при следующем суперстепе
+            self.indptr = None
+
+    def add_edges(self, edges: List[Tuple[int, int]]):
+        """Пакетное добавление ребер (индексы уже проверены вызывающим)"""
+        self._edges.extend(edges)
+        self.indptr = None
+
+    def finalize(self):
+        """Сборка CSR исходящих ребер из накопленного списка"""
+        n = max(self.num_vertices, 1)
+        src = np.asarray([edge[0] for edge in self._edges], dtype=np.int32)
+        dst = np.asarray([edge[1] for edge in self._edges], dtype=np.int32)
+        self.indices = dst[np.argsort(src, kind='stable')]
+        self.indptr = np.concatenate(
+            ([0], np.cumsum(np.bincount(src, minlength=n)[:self.num_vertices]))
+        ).astype(np.int32)
 
     def initialize_pagerank(self):
         """Инициализация значений PageRank"""
-        initial_value = 1.0 / self.num_vertices
-        for vertex in self.vertices:
-            vertex.value = initial_value
-            vertex.active = True
+        self.value.fill(1.0 / self.num_vertices)
+        self.active.fill(True)
+        self.n_active = self.num_vertices
 
     def run_superstep(self, damping_factor: float) -> bool:
         """
         Выполнение одного суперстепа
         Возвращает True, если есть активные вершины
         """
-        self.superstep += 1
-        self.messages = {}
-
-        # Фаза 1: Отправка сообщений активными вершинами
-        for vertex in self.vertices:
-            if vertex.active:
-                messages = vertex.send_messages()
-                for target_id, message_value in messages:
-                    if target_id not in self.messages:
-                        self.messages[target_id] = []
-                    self.messages[target_id].append(message_value)
+        if self.indptr is None:
+            self.finalize()
 
-        # Фаза 2: Получение сообщений и обновление значений
-        active_vertices = 0
-
-        for vertex in self.vertices:
-            # Получение входящих сообщений
-            incoming_messages = self.messages.get(vertex.id, [])
-            incoming_sum = sum(incoming_messages) if incoming_messages else 0
-
-            # Вычисление нового значения PageRank
-            random_walk = (1 - damping_factor) / self.num_vertices
-            new_value = random_walk + damping_factor * incoming_sum
+        self.superstep += 1
 
-            # Проверка на сходимость
-            if abs(new_value - vertex.value) > 1e-10:
-                vertex.active = True
-                active_vertices += 1
-            else:
-                vertex.active = False
+        # Фаза 1: рассылка долей активными вершинами — векторный
+        # scatter-add по CSR вместо словаря списков сообщений
+        degrees = np.diff(self.indptr)
+        shares = np.where((degrees > 0) & self.active,
+                          self.value / np.maximum(degrees, 1), 0.0)
+        incoming = np.zeros(self.num_vertices)
+        np.add.at(incoming, self.indices, np.repeat(shares, degrees))
 
-            # Обновление значения
-            vertex.value = new_value
+        # Фаза 2: обновление значений и флагов активности одним проходом;
+        # сходимость — одно векторное сравнение плюс sum вместо
+        # поэлементных ветвлений
+        random_walk = (1 - damping_factor) / self.num_vertices
+        new_value = random_walk + damping_factor * incoming
+        delta = np.abs(new_value - self.value)
+        self.active = delta > 1e-10
+        self.n_active = int(self.active.sum())
+        self.value = new_value
 
-        return active_vertices > 0
+        return self.n_active > 0
 
 
 class PageRankPregel:
@@ -103,14 +116,21 @@ class PageRankPregel:
         self.max_iterations = PAGERANK_CONFIG['max_iterations']
         self.tolerance = PAGERANK_CONFIG['tolerance']
 
-        # Получение информации о документах
-        self.documents = self.db.get_all_documents()
+        # Получение информации о документах (генератор материализуем:
+        # список переиспользуется в get_top_documents)
+        self.documents = list(self.db.get_all_documents())
         self.doc_ids = [doc[0] for doc in self.documents]
         self.num_documents = len(self.doc_ids)
 
+        # Текущий вектор рангов и счетчики матричного пути
+        self.x = None
+        self.supersteps = 0
+        self._active_count = 0
+
         if self.num_documents == 0:
             logger.warning("No documents in database")
             self.graph = None
+            self.MT = None
             return
 
         # Создание отображения ID документа -> индекс графа
@@ -127,14 +147,47 @@ class PageRankPregel:
 
     def build_graph(self):
         """Построение графа из данных базы"""
-        for doc_id in self.doc_ids:
-            source_idx = self.id_to_index[doc_id]
-            outgoing = self.db.get_outgoing_links(doc_id)
-
-            for target_doc_id, _ in outgoing:
-                if target_doc_id and target_doc_id in self.id_to_index:
-                    target_idx = self.id_to_index[target_doc_id]
-                    self.graph.add_edge(source_idx, target_idx)
+        # Все ребра одним SELECT вместо N запросов get_outgoing_links;
+        # перевод doc_id -> индекс одним проходом по списку пар
+        id_to_index = self.id_to_index
+        edges = [(id_to_index[source_id], id_to_index[target_id])
+                 for source_id, target_id in self.db.get_all_links()
+                 if source_id in id_to_index and target_id in id_to_index]
+        self.graph.add_edges(edges)
+
+        # Массивы для матричной итерации: исходящие степени и висячие
+        # вершины (их масса перераспределяется равномерно)
+        src = np.asarray([edge[0] for edge in edges], dtype=np.int32)
+        dst = np.asarray([edge[1] for edge in edges], dtype=np.int32)
+        n = max(self.num_documents, 1)
+        self.out_deg = np.bincount(src, minlength=n)[:self.num_documents]
+        self.dangling_mask = self.out_deg == 0
+
+        if SCIPY_AVAILABLE:
+            # Переходная матрица M[i, j] = 1/out_deg(i) для ребра i -> j;
+            # суперстеп целиком — одно произведение M.T @ x
+            data = 1.0 / self.out_deg[src]
+            transition = csr_matrix((data, (src, dst)),
+                                    shape=(self.num_documents,
+                                           self.num_documents))
+            self.MT = transition.T.tocsr()
+            self.in_indptr = None
+            self.in_indices = None
+            self.inv_out_degree = None
+        else:
+            self.MT = None
+            # CSR входящих ребер для общего pull-ядра pagerank_kernel
+            # (JIT через Numba при наличии, иначе NumPy)
+            self.in_indices = src[np.argsort(dst, kind='stable')]
+            self.in_indptr = np.concatenate(
+                ([0], np.cumsum(np.bincount(dst, minlength=n)[:self.num_documents]))
+            ).astype(np.int32)
+            # where=: деление не вычисляется для висячих вершин —
+            # без RuntimeWarning о делении на ноль
+            self.inv_out_degree = np.divide(
+                1.0, self.out_deg,
+                out=np.zeros(self.num_documents, dtype=np.float64),
+                where=self.out_deg > 0)
 
     def calculate(self) -> Dict[int, float]:
         """
@@ -146,6 +199,15 @@ class PageRankPregel:
 
         logger.info("Starting PageRank calculation using simplified Pregel approach")
 
+        if self.MT is not None:
+            if CUPY_AVAILABLE and self.num_documents >= GPU_MIN_DOCS:
+                return self._calculate_matrix_gpu()
+            return self._calculate_matrix()
+
+        if self.in_indptr is not None:
+            return self._calculate_kernel()
+
+        # Запасной путь: объектная Pregel-модель
         # Инициализация PageRank
         self.graph.initialize_pagerank()
 
@@ -153,11 +215,6 @@ class PageRankPregel:
         for iteration in range(self.max_iterations):
             active = self.graph.run_superstep(self.damping_factor)
 
-            # Сохранение текущих значений в базу данных
-            current_pagerank = self.get_current_pagerank()
-            for doc_id, rank in current_pagerank.items():
-                self.db.update_pagerank(doc_id, rank, iteration + 1)
-
             logger.info(f"Superstep {iteration + 1}: {self.count_active_vertices()} active vertices")
 
             # Проверка условия остановки
@@ -165,30 +222,145 @@ class PageRankPregel:
                 logger.info(f"PageRank converged after {iteration + 1} supersteps")
                 break
 
-        return self.get_current_pagerank()
+        # Финальные значения пишутся одним executemany в одной
+        # транзакции; промежуточные итерации в базе не нужны
+        result = self.get_current_pagerank()
+        self.db.update_pageranks_bulk(result, self.graph.superstep)
+        return result
+
+    def _calculate_matrix(self) -> Dict[int, float]:
+        """
+        Степенная итерация над CSR-матрицей переходов: каждый суперстеп —
+        одно разреженное матрично-векторное произведение на уровне C
+        """
+        n = self.num_documents
+        x = np.full(n, 1.0 / n)
+
+        for iteration in range(self.max_iterations):
+            dangling_sum = float(x[self.dangling_mask].sum())
+            x_new = ((1 - self.damping_factor) / n
+                     + self.damping_factor * dangling_sum / n
+                     + self.damping_factor * (self.MT @ x))
+
+            # Активные вершины: значение еще заметно меняется
+            diff = np.abs(x_new - x)
+            self._active_count = int((diff > 1e-10).sum())
+            total_diff = float(diff.sum())
+
+            x = x_new
+            self.x = x
+            self.supersteps = iteration + 1
+
+            logger.info("Superstep %d: %d active vertices",
+                        iteration + 1, self._active_count)
+
+            if total_diff < self.tolerance * n:
+                logger.info("PageRank converged after %d supersteps",
+                            iteration + 1)
+                break
+
+        # Один пакетный апдейт после сходимости вместо O(N)
+        # автокоммитных UPDATE на каждом суперстепе
+        result = self.get_current_pagerank()
+        self.db.update_pageranks_bulk(result, self.supersteps)
+        return result
+
+    def _calculate_matrix_gpu(self) -> Dict[int, float]:
+        """
+        Степенная итерация на GPU: CSR-матрица переходов переносится в
+        память устройства один раз, все суперстепы — SpMV на CUDA,
+        обратно на хост копируется только финальный вектор
+        """
+        n = self.num_documents
+        MT_gpu = cp_csr_matrix(self.MT.astype(np.float32))
+        dangling = cp.asarray(self.dangling_mask)
+        x = cp.full(n, 1.0 / n, dtype=cp.float32)
+
+        for iteration in range(self.max_iterations):
+            dangling_sum = float(x[dangling].sum())
+            x_new = ((1 - self.damping_factor) / n
+                     + self.damping_factor * dangling_sum / n
+                     + self.damping_factor * (MT_gpu @ x))
+
+            diff = cp.abs(x_new - x)
+            self._active_count = int((diff > 1e-10).sum())
+            total_diff = float(diff.sum())
+
+            x = x_new
+            self.supersteps = iteration + 1
+
+            logger.info("Superstep %d: %d active vertices (GPU)",
+                        iteration + 1, self._active_count)
+
+            if total_diff < self.tolerance * n:
+                logger.info("PageRank converged after %d supersteps",
+                            iteration + 1)
+                break
+
+        self.x = cp.asnumpy(x).astype(np.float64)
+        result = self.get_current_pagerank()
+        self.db.update_pageranks_bulk(result, self.supersteps)
+        return result
+
+    def _calculate_kernel(self) -> Dict[int, float]:
+        """
+        Суперстепы без scipy: общее pull-ядро из pagerank_kernel,
+        скомпилированное Numba при наличии (prange по вершинам)
+        """
+        n = self.num_documents
+        x = np.full(n, 1.0 / n)
+        x_new = np.empty_like(x)
+
+        for iteration in range(self.max_iterations):
+            dangling_sum = float(x[self.dangling_mask].sum())
+            base = ((1 - self.damping_factor) / n
+                    + self.damping_factor * dangling_sum / n)
+            pr_step(self.in_indptr, self.in_indices, self.inv_out_degree,
+                    x, x_new, self.damping_factor, base)
+
+            diff = np.abs(x_new - x)
+            self._active_count = int((diff > 1e-10).sum())
+            total_diff = float(diff.sum())
+
+            x, x_new = x_new, x
+            self.x = x
+            self.supersteps = iteration + 1
+
+            logger.info("Superstep %d: %d active vertices",
+                        iteration + 1, self._active_count)
+
+            if total_diff < self.tolerance * n:
+                logger.info("PageRank converged after %d supersteps",
+                            iteration + 1)
+                break
+
+        self.x = x.copy()
+
+        # Один пакетный апдейт после сходимости вместо O(N)
+        # автокоммитных UPDATE на каждом суперстепе
+        result = self.get_current_pagerank()
+        self.db.update_pageranks_bulk(result, self.supersteps)
+        return result
 
     def get_current_pagerank(self) -> Dict[int, float]:
         """Получение текущих значений PageRank"""
+        if self.x is not None:
+            return dict(zip(self.doc_ids, self.x.tolist()))
+
         if not self.graph:
             return {}
 
-        pagerank = {}
-        for i, vertex in enumerate(self.graph.vertices):
-            doc_id = self.index_to_id[i]
-            pagerank[doc_id] = vertex.value
-
-        return pagerank
+        return dict(zip(self.doc_ids, self.graph.value.tolist()))
 
     def count_active_vertices(self) -> int:
         """Подсчет активных вершин"""
+        if self.x is not None:
+            return self._active_count
+
         if not self.graph:
             return 0
 
-        count = 0
-        for vertex in self.graph.vertices:
-            if vertex.active:
-                count += 1
-        return count
+        return self.graph.n_active
 
     def get_top_documents(self, n: int = 10) -> List[Tuple[int, float, str]]:
         """
@@ -204,10 +376,9 @@ class PageRankPregel:
         for doc_id, url, title in self.documents:
             documents_info[doc_id] = (url, title)
 
-        # Сортировка по PageRank
-        sorted_docs = sorted(pagerank.items(),
-                             key=lambda x: x[1],
-                             reverse=True)[:n]
+        # Топ-N через кучу вместо полной сортировки всех документов
+        sorted_docs = heapq.nlargest(n, pagerank.items(),
+                                     key=operator.itemgetter(1))
 
         # Формирование результата
         result = []
@@ -224,7 +395,10 @@ class PageRankPregel:
         print(f"Damping factor: {self.damping_factor}")
         print(f"Max supersteps: {self.max_iterations}")
 
-        if self.graph:
+        if self.x is not None:
+            print(f"Current superstep: {self.supersteps}")
+            print(f"Active vertices: {self.count_active_vertices()}")
+        elif self.graph:
             print(f"Current superstep: {self.graph.superstep}")
             print(f"Active vertices: {self.count_active_vertices()}")
 
@@ -2,15 +2,27 @@
 Модуль парсинга веб-страниц
 """
 
+import functools
 import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urlparse, urljoin
+import threading
 import time
-from typing import List, Dict, Set, Tuple, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, List, Dict, Set, Tuple, Optional
 import logging
 from utils import normalize_url, extract_links, clean_text, tokenize, logger
 from config import PARSER_CONFIG, STOP_WORDS
-from database import Database
+from database import Database, pack_positions
+
+# lxml разбирает HTML на C и заметно быстрее встроенного html.parser;
+# при его отсутствии прозрачно откатываемся
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
 
 
 class WebParser:
@@ -19,30 +31,64 @@ class WebParser:
     def __init__(self, db: Database):
         self.db = db
         self.visited_urls: Set[str] = set()
-        self.urls_to_visit: List[str] = []
+        # Очередь обхода: deque дает O(1) взятие из головы,
+        # list.pop(0) сдвигал весь хвост
+        self.urls_to_visit: Deque[str] = deque()
+        # Зеркало очереди для O(1) проверки «уже в очереди?»
+        # (поиск по deque — линейный)
+        self.queued_urls: Set[str] = set()
         self.session = requests.Session()
         self.session.headers.update({'User-Agent': PARSER_CONFIG['user_agent']})
         self.max_pages = PARSER_CONFIG['max_pages']
         self.max_content_length = PARSER_CONFIG['max_content_length']
+        self.fetch_workers = PARSER_CONFIG['fetch_workers']
+        self.per_host_delay = PARSER_CONFIG['per_host_delay']
+
+        # Время последнего запроса к каждому хосту — вежливость
+        # обеспечивается по-хостово, а не глобальной паузой
+        self._host_last_fetch: Dict[str, float] = {}
+        self._throttle_lock = threading.Lock()
+
+        # Мемоизация нормализации: одни и те же URL повторяются на
+        # многих страницах, а urlparse/urljoin аллоцируют на каждый вызов
+        self._normalize = functools.lru_cache(maxsize=200_000)(normalize_url)
 
         logger.info("WebParser initialized")
 
     def add_start_urls(self, urls: List[str]):
         """Добавление начальных URL для парсинга"""
         for url in urls:
-            normalized_url = normalize_url('', url)
-            if normalized_url not in self.visited_urls:
+            normalized_url = self._normalize('', url)
+            if (normalized_url not in self.visited_urls and
+                    normalized_url not in self.queued_urls):
                 self.urls_to_visit.append(normalized_url)
+                self.queued_urls.add(normalized_url)
 
         logger.info(f"Added {len(urls)} start URLs")
 
-    def parse_page(self, url: str) -> Optional[Tuple[str, str, str, List[str]]]:
+    def _throttle(self, host: str):
+        """Выдерживание минимального интервала между запросами к хосту"""
+        while True:
+            with self._throttle_lock:
+                now = time.monotonic()
+                last = self._host_last_fetch.get(host, 0.0)
+                wait = last + self.per_host_delay - now
+                if wait <= 0:
+                    self._host_last_fetch[host] = now
+                    return
+            time.sleep(wait)
+
+    def fetch_page(self, url: str) -> Optional['requests.Response']:
         """
-        Парсинг одной страницы
-        Возвращает: (title, content, список ссылок) или None при ошибке
+        Загрузка одной страницы (I/O-часть, выполняется в пуле потоков)
+        Возвращает: response или None при ошибке
         """
         try:
-            logger.info(f"Parsing: {url}")
+            logger.info(f"Fetching: {url}")
+
+            # Разные хосты качаются параллельно, один хост — не чаще
+            # чем раз в per_host_delay секунд
+            self._throttle(urlparse(url).netloc)
 
             # Загрузка страницы
             response = self.session.get(url, timeout=PARSER_CONFIG['timeout'])
@@ -59,8 +105,20 @@ class WebParser:
                 logger.warning(f"Non-HTML content for {url}: {content_type}")
                 return None
 
+            return response
+
+        except requests.RequestException as e:
+            logger.error(f"Error downloading {url}: {e}")
+            return None
+
+    def parse_response(self, url: str, response) -> Optional[Tuple[str, str, List[str]]]:
+        """
+        Разбор загруженной страницы (CPU-часть)
+        Возвращает: (title, content, список ссылок) или None при ошибке
+        """
+        try:
             # Парсинг HTML
-            soup = BeautifulSoup(response.content, 'html.parser')
+            soup = BeautifulSoup(response.content, HTML_PARSER)
 
             # Извлечение заголовка
             title_tag = soup.find('title')
@@ -84,13 +142,20 @@ class WebParser:
 
             return title, content, links
 
-        except requests.RequestException as e:
-            logger.error(f"Error downloading {url}: {e}")
-            return None
         except Exception as e:
             logger.error(f"Error parsing {url}: {e}")
             return None
 
+    def parse_page(self, url: str) -> Optional[Tuple[str, str, List[str]]]:
+        """
+        Загрузка и разбор одной страницы
+        Возвращает: (title, content, список ссылок) или None при ошибке
+        """
+        response = self.fetch_page(url)
+        if response is None:
+            return None
+        return self.parse_response(url, response)
+
     def index_document(self, url: str, title: str, content: str, links: List[str]):
         """Индексация документа в базе данных"""
         try:
@@ -106,46 +171,46 @@ class WebParser:
 
             if not tokens:
                 logger.warning(f"No tokens found in document {url}")
-                # Все равно добавляем ссылки
-                for link in links:
-                    target_doc_id = self.db.get_document_id(link)
-                    self.db.add_link(doc_id, link, target_doc_id)
+                # Все равно добавляем ссылки (одним executemany)
+                target_doc_ids = self.db.get_document_ids_bulk(links)
+                self.db.add_links_bulk(
+                    [(doc_id, link, target_doc_ids.get(link))
+                     for link in links])
                 return
 
-            # Расчет TF и позиций
-            from collections import Counter
+            # Позиции и частоты за один проход: частота слова — это
+            # просто длина его списка позиций, отдельный Counter не нужен
             total_terms = len(tokens)
-            term_counts = Counter(tokens)
-
-            # Добавление слов и создание обратного индекса
             positions_cache = {}
             for i, token in enumerate(tokens):
-                if token not in positions_cache:
-                    positions_cache[token] = []
-                positions_cache[token].append(i)
-
-            # Обрабатываем каждое уникальное слово в документе
-            for word, count in term_counts.items():
-                # Добавление слова
-                word_id = self.db.add_word(word)
-                if word_id == -1:
-                    continue
+                positions_cache.setdefault(token, []).append(i)
 
-                # Расчет TF (сохраняем как count для более точного восстановления)
-                # Вместо tf = count / total_terms, сохраняем частоту
-                tf = count  # Сохраняем абсолютную частоту
+            term_counts = {word: len(positions)
+                           for word, positions in positions_cache.items()}
 
-                # Получение позиций
-                positions = positions_cache.get(word, [])
+            # Пакетная запись слов и обратного индекса в одной транзакции
+            with self.db.transaction():
+                # Длина документа в терминах сохраняется для поиска
+                self.db.set_document_length(doc_id, total_terms)
 
-                # Добавление в обратный индекс
-                self.db.add_inverted_index_entry(word_id, doc_id, tf, positions)
+                word_ids = self.db.add_words_bulk(term_counts)
 
-            # Добавление ссылок
-            for link in links:
-                # Проверяем, есть ли целевой документ уже в базе
-                target_doc_id = self.db.get_document_id(link)
-                self.db.add_link(doc_id, link, target_doc_id)
+                # Расчет TF (сохраняем как count для более точного восстановления)
+                # Вместо tf = count / total_terms, сохраняем частоту
+                entries = [
+                    (word_ids[word], doc_id, float(count),
+                     pack_positions(positions_cache.get(word, [])))
+                    for word, count in term_counts.items()
+                    if word in word_ids
+                ]
+                self.db.add_inverted_index_bulk(entries)
+
+                # Добавление ссылок: целевые ID разрешаем одним запросом,
+                # вставляем одним executemany
+                target_doc_ids = self.db.get_document_ids_bulk(links)
+                self.db.add_links_bulk(
+                    [(doc_id, link, target_doc_ids.get(link))
+                     for link in links])
 
             logger.info(f"Indexed: {url} (ID: {doc_id}, Words: {len(term_counts)}, Links: {len(links)})")
 
@@ -164,41 +229,59 @@ class WebParser:
 
         pages_parsed = 0
 
-        while self.urls_to_visit and pages_parsed < self.max_pages:
-            # Берем следующий URL
-            url = self.urls_to_visit.pop(0)
+        # Загрузка — в пуле потоков (ограничение по хостам внутри
+        # fetch_page), разбор и индексация — последовательно: SQLite
+        # пишется из одного потока
+        with ThreadPoolExecutor(max_workers=self.fetch_workers) as executor:
+            while self.urls_to_visit and pages_parsed < self.max_pages:
+                # Набираем волну URL (не больше лимита оставшихся страниц)
+                batch = []
+                while (self.urls_to_visit and
+                        len(batch) < self.fetch_workers and
+                        pages_parsed + len(batch) < self.max_pages):
+                    url = self.urls_to_visit.popleft()
+                    self.queued_urls.discard(url)
+
+                    # Пропускаем уже посещенные
+                    if url in self.visited_urls:
+                        continue
+
+                    batch.append(url)
+
+                if not batch:
+                    continue
 
-            # Пропускаем уже посещенные
-            if url in self.visited_urls:
-                continue
+                # Параллельная загрузка волны
+                responses = list(executor.map(self.fetch_page, batch))
 
-            # Парсинг страницы
-            result = self.parse_page(url)
-            if not result:
-                self.visited_urls.add(url)
-                continue
+                for url, response in zip(batch, responses):
+                    # Добавление в посещенные
+                    self.visited_urls.add(url)
 
-            title, content, links = result
+                    if response is None:
+                        continue
 
-            # Индексация документа
-            self.index_document(url, title, content, links)
+                    # Разбор страницы
+                    result = self.parse_response(url, response)
+                    if not result:
+                        continue
 
-            # Добавление в посещенные
-            self.visited_urls.add(url)
-            pages_parsed += 1
+                    title, content, links = result
 
-            # Добавление новых ссылок в очередь
-            for link in links:
-                if (link not in self.visited_urls and
-                        link not in self.urls_to_visit):
-                    self.urls_to_visit.append(link)
+                    # Индексация документа
+                    self.index_document(url, title, content, links)
+                    pages_parsed += 1
 
-            # Задержка для избежания блокировки
-            time.sleep(0.5)
+                    # Добавление новых ссылок в очередь
+                    for link in links:
+                        if (link not in self.visited_urls and
+                                link not in self.queued_urls):
+                            self.urls_to_visit.append(link)
+                            self.queued_urls.add(link)
 
-            # Логирование прогресса
-            if pages_parsed % 10 == 0:
-                logger.info(f"Progress: {pages_parsed} pages parsed, {len(self.urls_to_visit)} in queue")
+                    # Логирование прогресса
+                    if pages_parsed % 10 == 0:
+                        logger.info(f"Progress: {pages_parsed} pages parsed, {len(self.urls_to_visit)} in queue")
 
         logger.info(f"Crawling completed. Total pages parsed: {pages_parsed}")
 
@@ -2,10 +2,13 @@
 Модуль полнотекстового поиска
 """
 
+import heapq
 import math
-from typing import List, Dict, Tuple, Set, Any
+import operator
+from functools import lru_cache
+from typing import List, Dict, Tuple, Set, Any, Optional
 import logging
-from collections import defaultdict
+import numpy as np
 from database import Database
 from config import SEARCH_CONFIG, STOP_WORDS
 from utils import clean_text, tokenize, generate_snippet, logger
@@ -23,8 +26,39 @@ class SearchEngine:
         # Кэш для IDF значений
         self.idf_cache = {}
 
+        # Длины документов в терминах: посчитаны при индексации,
+        # загружаются одним запросом вместо токенизации всего корпуса
+        self.doc_lengths = self.db.get_all_document_lengths()
+
+        # Обратный индекс целиком в памяти: K терминов запроса
+        # обслуживаются без единого SQL-запроса
+        self.postings = self.db.get_all_postings()
+
+        # Документные частоты, посчитанные при индексации:
+        # IDF — это словарный lookup плюс math.log
+        self.df = self.db.get_all_dfs()
+
+        # Плотное отображение doc_id -> внутренний индекс и массивы
+        # для векторного скоринга
+        self._doc_index = {doc_id: i for i, doc_id in enumerate(self.doc_lengths)}
+        self._doc_ids_arr = np.fromiter(self.doc_lengths.keys(), dtype=np.int64,
+                                        count=len(self.doc_lengths))
+        self._len_arr = np.fromiter(self.doc_lengths.values(), dtype=np.float64,
+                                    count=len(self.doc_lengths))
+
         logger.info(f"SearchEngine initialized for {self.total_documents} documents")
 
+    @lru_cache(maxsize=2048)
+    def _content(self, doc_id: int) -> Optional[str]:
+        """Содержимое документа с кэшированием: один документ часто
+        попадает в выдачу нескольких запросов подряд"""
+        return self.db.get_document_content(doc_id)
+
+    @lru_cache(maxsize=2048)
+    def _doc_info(self, doc_id: int) -> Optional[Tuple]:
+        """Информация о документе (url, title, ...) с кэшированием"""
+        return self.db.get_document_info(doc_id)
+
     def calculate_idf(self, word: str) -> float:
         """
         Расчет IDF (Inverse Document Frequency)
@@ -33,9 +67,8 @@ class SearchEngine:
         if word in self.idf_cache:
             return self.idf_cache[word]
 
-        # Количество документов, содержащих слово
-        docs_with_word = self.db.get_documents_for_word(word)
-        doc_count = len(docs_with_word)
+        # Документная частота персистится при индексации
+        doc_count = self.df.get(word, 0)
 
         if doc_count == 0:
             self.idf_cache[word] = 0.0
@@ -66,72 +99,77 @@ class SearchEngine:
         if not query_terms:
             return []
 
-        # Словарь для хранения оценок документов
-        scores = defaultdict(float)
-        doc_lengths = {}  # Для хранения длин документов в терминах
-
-        # Получаем все документы для предварительной обработки
-        all_docs = self.db.get_all_documents()
+        num_docs = len(self._doc_ids_arr)
+        if num_docs == 0:
+            return []
 
-        # Собираем информацию о длинах документов
-        for doc_id, url, title in all_docs:
-            content = self.db.get_document_content(doc_id)
-            if content:
-                tokens = tokenize(content, STOP_WORDS)
-                doc_lengths[doc_id] = len(tokens)
+        # Плотный вектор оценок по внутренним индексам документов
+        scores = np.zeros(num_docs, dtype=np.float32)
 
         # Обработка каждого термина отдельно
         for term in query_terms:
-            # Получение документов, содержащих термин
-            docs_with_term = self.db.get_documents_for_word(term)
+            # Получение документов, содержащих термин (из кэша постингов)
+            docs_with_term = self.postings.get(term, [])
 
             # Расчет IDF для термина
             idf = self.calculate_idf(term)
 
-            if idf == 0.0:
+            if idf == 0.0 or not docs_with_term:
                 continue  # Пропускаем слова, которых нет в коллекции
 
-            # Добавление вклада термина в оценку каждого документа
-            for doc_id, raw_tf in docs_with_term:
-                if doc_id not in doc_lengths or doc_lengths[doc_id] == 0:
-                    continue
-
-                # Нормализованный TF
-                term_count = int(raw_tf * doc_lengths[doc_id])  # Преобразуем обратно в count
-                tf = self.calculate_tf(term_count, doc_lengths[doc_id])
+            # Постинг-лист -> массивы индексов и tf; вклад термина
+            # рассыпается по вектору одним scatter-add
+            idx = np.fromiter(
+                (self._doc_index[doc_id] for doc_id, _ in docs_with_term
+                 if doc_id in self._doc_index), dtype=np.int64)
+            raw_tf = np.fromiter(
+                (tf for doc_id, tf in docs_with_term
+                 if doc_id in self._doc_index), dtype=np.float64)
+            if idx.size == 0:
+                continue
 
-                # TF-IDF оценка
-                tfidf = tf * idf
-                scores[doc_id] += tfidf
+            lengths = self._len_arr[idx]
+            # round, а не int: квантование tf дает значения вида 1.999998
+            term_counts = np.round(raw_tf * lengths)
+            tf_norm = np.divide(term_counts, lengths,
+                                out=np.zeros_like(term_counts),
+                                where=lengths > 0)
+            np.add.at(scores, idx, (tf_norm * idf).astype(np.float32))
 
         # Применение PageRank, если требуется
-        if use_pagerank and scores:
+        if use_pagerank and scores.any():
             pageranks = self.db.get_all_pageranks()
 
             # Нормализуем TF-IDF scores
-            if scores:
-                max_score = max(scores.values())
-                if max_score > 0:
-                    for doc_id in scores:
-                        scores[doc_id] = scores[doc_id] / max_score
-
-            # Применяем PageRank
-            for doc_id in list(scores.keys()):
-                pagerank = pageranks.get(doc_id, 1.0)
-                # Комбинирование: TF-IDF * (1 + PageRank)
-                # PageRank обычно в диапазоне 0-1, поэтому добавляем 1
-                scores[doc_id] = scores[doc_id] * (1.0 + pagerank)
-
-        # Сортировка результатов
-        sorted_results = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+            max_score = float(scores.max())
+            if max_score > 0:
+                scores /= max_score
+
+            # Комбинирование: TF-IDF * (1 + PageRank) — одно векторное
+            # умножение вместо обхода словаря
+            pr_vec = np.fromiter(
+                (pageranks.get(int(doc_id), 1.0) for doc_id in self._doc_ids_arr),
+                dtype=np.float32, count=num_docs)
+            scores *= 1.0 + pr_vec
+
+        # Отбор топ-k: argpartition выделяет k лучших за O(n),
+        # полная сортировка — только внутри выборки
+        nonzero = np.nonzero(scores)[0]
+        k = self.results_per_page
+        if nonzero.size > k:
+            top = nonzero[np.argpartition(-scores[nonzero], k - 1)[:k]]
+        else:
+            top = nonzero
+        order = top[np.argsort(-scores[top], kind='stable')]
 
         # Форматирование результатов
         formatted_results = []
-        for doc_id, score in sorted_results[:self.results_per_page]:
-            content = self.db.get_document_content(doc_id)
+        for i in order[:self.results_per_page]:
+            doc_id = int(self._doc_ids_arr[i])
+            content = self._content(doc_id)
             if content:
                 snippet = generate_snippet(content, query_terms, self.snippet_length)
-                formatted_results.append((doc_id, score, snippet))
+                formatted_results.append((doc_id, float(scores[i]), snippet))
 
         return formatted_results
 
@@ -150,39 +188,37 @@ class SearchEngine:
         for term in query_terms:
             term_idf[term] = self.calculate_idf(term)
 
-        # Словарь для хранения TF-IDF значений для каждого документа
-        doc_scores = {}
-
-        # Получение всех документов
-        all_docs = self.db.get_all_documents()
+        # Постинг-листы терминов: кандидаты приходят из обратного
+        # индекса, корпус не сканируется и не токенизируется
+        postings = {}
+        for term in query_terms:
+            if term_idf[term] == 0.0:
+                continue  # Термина нет в коллекции
+            postings[term] = dict(self.postings.get(term, ()))
 
-        # Обработка каждого документа отдельно
-        for doc_id, url, title in all_docs:
-            # Получение содержимого документа
-            content = self.db.get_document_content(doc_id)
-            if not content:
-                continue
+        # Кандидаты — объединение постинг-листов
+        candidate_ids = set()
+        for posting in postings.values():
+            candidate_ids.update(posting)
 
-            # Токенизация содержимого
-            doc_tokens = tokenize(content, STOP_WORDS)
-            total_terms = len(doc_tokens)
+        # Словарь для хранения TF-IDF значений для каждого документа
+        doc_scores = {}
 
+        # Обработка каждого документа-кандидата отдельно
+        for doc_id in candidate_ids:
+            total_terms = self.doc_lengths.get(doc_id, 0)
             if total_terms == 0:
                 continue
 
-            # Расчет TF для каждого термина запроса в этом документе
+            # Накопление вклада каждого термина запроса в этот документ
             doc_score = 0.0
-            for term in query_terms:
-                # Пропускаем термины с нулевым IDF
-                if term_idf[term] == 0.0:
-                    continue
-
-                # Подсчет частоты термина в документе
-                term_count = doc_tokens.count(term)
-                if term_count > 0:
+            for term, posting in postings.items():
+                raw_tf = posting.get(doc_id)
+                if raw_tf:
+                    # round, а не int: квантование tf дает 1.999998 и т.п.
+                    term_count = int(round(raw_tf * total_terms))
                     tf = self.calculate_tf(term_count, total_terms)
-                    idf = term_idf[term]
-                    doc_score += tf * idf
+                    doc_score += tf * term_idf[term]
 
             if doc_score > 0:
                 doc_scores[doc_id] = doc_score
@@ -191,24 +227,23 @@ class SearchEngine:
         if use_pagerank and doc_scores:
             pageranks = self.db.get_all_pageranks()
 
-            # Нормализуем scores
+            # Нормализация и PageRank одним проходом по items():
+            # без копии ключей и повторного обхода словаря
             max_score = max(doc_scores.values())
-            if max_score > 0:
-                for doc_id in doc_scores:
-                    doc_scores[doc_id] = doc_scores[doc_id] / max_score
-
-            # Применяем PageRank
-            for doc_id in list(doc_scores.keys()):
+            inv_max = 1.0 / max_score if max_score > 0 else 1.0
+            for doc_id, score in doc_scores.items():
                 pagerank = pageranks.get(doc_id, 1.0)
-                doc_scores[doc_id] = doc_scores[doc_id] * (1.0 + pagerank)
+                doc_scores[doc_id] = score * inv_max * (1.0 + pagerank)
 
-        # Сортировка результатов
-        sorted_results = sorted(doc_scores.items(), key=lambda x: x[1], reverse=True)
+        # Отбор топ-k без полной сортировки всех кандидатов
+        sorted_results = heapq.nlargest(self.results_per_page,
+                                        doc_scores.items(),
+                                        key=operator.itemgetter(1))
 
         # Форматирование результатов
         formatted_results = []
-        for doc_id, score in sorted_results[:self.results_per_page]:
-            content = self.db.get_document_content(doc_id)
+        for doc_id, score in sorted_results:
+            content = self._content(doc_id)
             if content:
                 snippet = generate_snippet(content, query_terms, self.snippet_length)
                 formatted_results.append((doc_id, score, snippet))
@@ -244,8 +279,8 @@ class SearchEngine:
         print("-" * 80)
 
         for i, (doc_id, score, snippet) in enumerate(results, 1):
-            # Получаем информацию о документе
-            doc_info = self.db.get_document_info(doc_id)
+            # Получаем информацию о документе (из кэша)
+            doc_info = self._doc_info(doc_id)
             title = doc_info[1] if doc_info else f"Document {doc_id}"
             url = doc_info[0] if doc_info else "Unknown URL"
 
@@ -3,25 +3,71 @@
 """
 
 import re
+import multiprocessing
+import os
 import string
-import hashlib
-from typing import List, Dict, Set, Tuple, Any
+from typing import List, Dict, Set, Tuple, Any, Optional
 from urllib.parse import urljoin, urlparse
-from collections import defaultdict
+from collections import Counter
+from functools import lru_cache
 import logging
-
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+from config import PUNCTUATION_TRANSLATE
+import numpy as np
+
+try:
+    from scipy.sparse import csr_matrix
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+# Аho-Корасик ищет все литералы за один линейный проход на C;
+# без библиотеки остаемся на скомпилированной альтернации re
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# Конфигурацию логирования задает приложение (main.py): настройка на
+# импорте библиотечного модуля плодила бы дубли обработчиков в
+# multiprocessing-воркерах
 logger = logging.getLogger(__name__)
 
+# Прекомпилированные шаблоны: паттерны в горячем цикле обработки
+# текста не должны искаться в кэше re при каждом вызове.
+# Любая последовательность из HTML-тегов, не-словесных символов и
+# пробелов схлопывается в один пробел за один проход по строке
+_CLEAN_RE = re.compile(r'(?:<[^>]+>|[^\w\s]|\s)+')
+_HREF_RE = re.compile(r'href=[\'"]?([^\'" >]+)', re.IGNORECASE)
+
+# Единый пустой frozenset вместо аллокации set() на каждый вызов;
+# иммутабельный набор шарится между форк-воркерами без копирования
+_DEFAULT_STOP: frozenset = frozenset()
+
+# lxml разбирает HTML на C: извлечение ссылок настоящим парсером
+# быстрее и корректнее регулярного выражения по всей странице
+try:
+    import lxml.html
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
 
+@lru_cache(maxsize=1 << 17)
 def normalize_url(base_url: str, url: str) -> str:
     """
-    Нормализация URL
+    Нормализация URL. Результат кэшируется: одни и те же пары
+    (base, href) встречаются на множестве страниц (навигация, футеры),
+    а urljoin/urlparse недешевы
     """
+    # Быстрый путь: абсолютный URL без query и фрагмента — подавляющее
+    # большинство ссылок; urljoin/urlparse можно не вызывать
+    if (url.startswith(('http://', 'https://'))
+            and '#' not in url and '?' not in url):
+        if url.endswith('/'):
+            url = url[:-1]
+        return url.lower()
+
     try:
         # Преобразование относительного URL в абсолютный
         absolute_url = urljoin(base_url, url)
@@ -38,7 +84,7 @@ def normalize_url(base_url: str, url: str) -> str:
 
         return normalized_url.lower()
     except Exception as e:
-        logger.error(f"Error normalizing URL {url}: {e}")
+        logger.error("Error normalizing URL %s: %s", url, e)
         return url
 
 
@@ -46,13 +92,21 @@ def extract_links(html_content: str, base_url: str) -> List[str]:
     """
     Извлечение ссылок из HTML контента
     """
-    import re
-
-    # Регулярное выражение для поиска ссылок
-    link_pattern = r'href=[\'"]?([^\'" >]+)'
-    links = re.findall(link_pattern, html_content, re.IGNORECASE)
-
-    # Нормализация ссылок
+    links = None
+    if LXML_AVAILABLE and html_content.strip():
+        try:
+            # Все атрибуты href одним XPath по разобранному дереву
+            links = lxml.html.fromstring(html_content).xpath('//@href')
+        except lxml.etree.ParserError:
+            links = None
+
+    if links is None:
+        # Запасной путь: поиск прекомпилированным шаблоном
+        links = _HREF_RE.findall(html_content)
+
+    # Нормализация ссылок: дубликаты отсекаются бегущим set за один
+    # проход, порядок появления на странице сохраняется
+    seen = set()
     normalized_links = []
     for link in links:
         # Пропускаем якорные ссылки и javascript
@@ -60,26 +114,40 @@ def extract_links(html_content: str, base_url: str) -> List[str]:
             continue
 
         normalized = normalize_url(base_url, link)
-        if normalized:
+        if normalized and normalized not in seen:
+            seen.add(normalized)
             normalized_links.append(normalized)
 
-    return list(set(normalized_links))  # Удаление дубликатов
+    return normalized_links
 
 
-def clean_text(text: str) -> str:
+def clean_text_fast(text_bytes: bytes) -> bytes:
     """
-    Очистка текста от лишних символов и приведение к нижнему регистру
+    Очистка чистого ASCII на уровне байтов: векторные маски NumPy
+    опускают регистр и гасят не-словесные символы без ветвления на
+    символ, split/join схлопывает пробельные серии на C.
+    Не обрабатывает HTML-теги — вызывающий отсекает тексты с '<'
     """
-    # Удаление HTML тегов
-    text = re.sub(r'<[^>]+>', ' ', text)
+    b = np.frombuffer(text_bytes, dtype=np.uint8).copy()
+    upper = (b >= 65) & (b <= 90)
+    b[upper] += 32
+    word = ((b >= 97) & (b <= 122)) | ((b >= 48) & (b <= 57)) | (b == 95)
+    b[~word] = 32
+    return b' '.join(b.tobytes().split())
 
-    # Удаление специальных символов
-    text = re.sub(r'[^\w\s]', ' ', text)
 
-    # Замена множественных пробелов на один
-    text = re.sub(r'\s+', ' ', text)
+def clean_text(text: str) -> str:
+    """
+    Очистка текста от лишних символов и приведение к нижнему регистру
+    """
+    # Быстрый путь для ASCII без разметки — типичный случай после
+    # извлечения текста из HTML
+    if '<' not in text and text.isascii():
+        return clean_text_fast(text.encode('ascii')).decode('ascii')
 
-    return text.strip().lower()
+    # Теги, спецсимволы и пробельные серии убираются одним проходом:
+    # три отдельных re.sub читали и аллоцировали всю строку трижды
+    return _CLEAN_RE.sub(' ', text).strip().lower()
 
 
 def tokenize(text: str, stop_words: Set[str] = None) -> List[str]:
@@ -87,18 +155,52 @@ def tokenize(text: str, stop_words: Set[str] = None) -> List[str]:
     Токенизация текста с удалением стоп-слов
     """
     if stop_words is None:
-        stop_words = set()
+        stop_words = _DEFAULT_STOP
 
-    # Очистка текста
-    text = clean_text(text)
+    # Быстрый путь для ASCII без разметки: очистка по байтам
+    if '<' not in text and text.isascii():
+        cleaned = clean_text_fast(text.encode('ascii')).decode('ascii')
+        return [token for token in cleaned.split()
+                if token not in stop_words]
 
-    # Разделение на токены
-    tokens = text.split()
+    # Очистка, разбиение и фильтрация одним проходом: split по тому же
+    # шаблону, что и clean_text, не строит промежуточную очищенную
+    # строку и не проходит по ней второй раз
+    return [token for token in _CLEAN_RE.split(text.lower())
+            if token and token not in stop_words]
 
-    # Удаление стоп-слов
-    tokens = [token for token in tokens if token not in stop_words]
 
-    return tokens
+def _process_page(args: Tuple[str, str, frozenset]) -> Tuple[List[str], List[str]]:
+    """Воркер пула: ссылки и токены одной страницы
+    (модульная функция — требование pickle для multiprocessing)"""
+    html_content, base_url, stop_words = args
+    links = extract_links(html_content, base_url)
+    tokens = tokenize(html_content, stop_words)
+    return links, tokens
+
+
+def process_pages(html_docs: List[str], base_urls: List[str],
+                  stop_words: Set[str] = None,
+                  n_proc: int = None) -> List[Tuple[List[str], List[str]]]:
+    """
+    Пакетная обработка страниц по процессам: extract_links и tokenize —
+    чистый CPU-bound Python, поэтому масштабируются почти линейно по
+    ядрам. Возвращает [(links, tokens), ...] в порядке входных страниц
+    """
+    stop_words = frozenset(stop_words or ())
+    tasks = [(html, base, stop_words)
+             for html, base in zip(html_docs, base_urls)]
+
+    if n_proc is None:
+        n_proc = os.cpu_count() or 1
+
+    # На одном ядре (или для пары страниц) пул не окупает fork
+    if n_proc <= 1 or len(tasks) < 2:
+        return [_process_page(task) for task in tasks]
+
+    chunksize = max(1, len(tasks) // (n_proc * 4))
+    with multiprocessing.Pool(processes=n_proc) as pool:
+        return pool.map(_process_page, tasks, chunksize=chunksize)
 
 
 def calculate_tf(tokens: List[str]) -> Dict[str, float]:
@@ -108,17 +210,121 @@ def calculate_tf(tokens: List[str]) -> Dict[str, float]:
     if not tokens:
         return {}
 
-    total_terms = len(tokens)
-    tf = {}
-
-    for token in tokens:
-        tf[token] = tf.get(token, 0) + 1
+    # Подсчет на C через Counter вместо двух dict-обращений на токен;
+    # нормализация умножением на обратную длину — без деления на ключ
+    inv_total = 1.0 / len(tokens)
+    return {token: count * inv_total
+            for token, count in Counter(tokens).items()}
 
-    # Нормализация
-    for token in tf:
-        tf[token] = tf[token] / total_terms
 
-    return tf
+def calculate_tf_batch(docs_tokens: List[List[str]]) -> Tuple[Any, Dict[str, int]]:
+    """
+    Пакетный расчет TF по корпусу: матрица документы x термины
+    (CSR при наличии scipy, иначе плотный numpy-массив) и словарь
+    термин -> номер столбца. Счет и нормализация выполняются
+    векторно, без Python-цикла по токенам каждого документа
+    """
+    vocab: Dict[str, int] = {}
+    indices: List[int] = []
+    indptr = [0]
+    for tokens in docs_tokens:
+        for token in tokens:
+            indices.append(vocab.setdefault(token, len(vocab)))
+        indptr.append(len(indices))
+
+    num_docs = len(docs_tokens)
+    num_terms = max(len(vocab), 1)
+    col = np.asarray(indices, dtype=np.int32)
+    indptr_arr = np.asarray(indptr, dtype=np.int32)
+    doc_lengths = np.maximum(np.diff(indptr_arr), 1)
+
+    if SCIPY_AVAILABLE:
+        matrix = csr_matrix(
+            (np.ones(len(col)), col, indptr_arr),
+            shape=(num_docs, num_terms))
+        matrix.sum_duplicates()
+        # Нормализация строк: счетчики делятся на длину документа
+        matrix.data /= np.repeat(doc_lengths, np.diff(matrix.indptr))
+        return matrix, vocab
+
+    # Запасной путь без scipy: плотная матрица и scatter-add
+    matrix = np.zeros((num_docs, num_terms))
+    row = np.repeat(np.arange(num_docs, dtype=np.int32),
+                    np.diff(indptr_arr))
+    np.add.at(matrix, (row, col), 1.0)
+    matrix /= doc_lengths[:, np.newaxis]
+    return matrix, vocab
+
+
+def calculate_tfidf_batch(docs_tokens: List[List[str]]) -> Tuple[Any, Dict[str, int]]:
+    """
+    Корпусный TF-IDF: TF-матрица из calculate_tf_batch умножается на
+    IDF-вектор (формула как в SearchEngine: log((N+1)/(df+1)) + 1) и
+    L2-нормализуется по строкам. Агрегация df и нормализация — целиком
+    в NumPy, без Python-цикла по документам
+    """
+    tf, vocab = calculate_tf_batch(docs_tokens)
+    num_docs = len(docs_tokens)
+    num_terms = tf.shape[1]
+
+    if SCIPY_AVAILABLE:
+        # После sum_duplicates индексы уникальны в строке: bincount по
+        # ним — это документная частота каждого термина
+        df = np.bincount(tf.indices, minlength=num_terms)
+        idf = np.log((num_docs + 1) / (df + 1)) + 1
+        matrix = tf.multiply(idf).tocsr()
+
+        norms = np.sqrt(np.asarray(matrix.power(2).sum(axis=1)).ravel())
+        matrix.data /= np.repeat(np.where(norms > 0, norms, 1.0),
+                                 np.diff(matrix.indptr))
+        return matrix, vocab
+
+    df = (tf > 0).sum(axis=0)
+    idf = np.log((num_docs + 1) / (df + 1)) + 1
+    matrix = tf * idf
+    norms = np.sqrt((matrix ** 2).sum(axis=1))
+    matrix /= np.where(norms > 0, norms, 1.0)[:, np.newaxis]
+    return matrix, vocab
+
+
+@lru_cache(maxsize=256)
+def _build_term_scanner(terms: Tuple[str, ...]):
+    """Сканер терминов запроса (термины уже в нижнем регистре):
+    автомат Ахо-Корасика при наличии, иначе альтернация re.
+    Кэшируется: один запрос порождает сниппеты для многих документов"""
+    if AHOCORASICK_AVAILABLE:
+        automaton = ahocorasick.Automaton()
+        for term in terms:
+            automaton.add_word(term, len(term))
+        automaton.make_automaton()
+        return automaton
+    return re.compile('|'.join(re.escape(term) for term in terms))
+
+
+def _find_first_term(lowered: str, terms: Tuple[str, ...]) -> Optional[int]:
+    """Позиция самого раннего вхождения любого из терминов"""
+    # Пустой запрос: нечего искать (пустая альтернация re совпала бы
+    # на позиции 0, а max() по длинам терминов упал бы)
+    if not terms:
+        return None
+
+    scanner = _build_term_scanner(terms)
+
+    if not AHOCORASICK_AVAILABLE:
+        match = scanner.search(lowered)
+        return match.start() if match else None
+
+    # Автомат отдает совпадения по возрастанию конца; прерываемся, как
+    # только более раннее начало стало недостижимым
+    max_term_len = max(len(term) for term in terms)
+    best = None
+    for end_index, length in scanner.iter(lowered):
+        start = end_index - length + 1
+        if best is None or start < best:
+            best = start
+        if end_index - max_term_len >= best:
+            break
+    return best
 
 
 def generate_snippet(text: str, query_terms: List[str], max_length: int = 150) -> str:
@@ -128,24 +334,14 @@ def generate_snippet(text: str, query_terms: List[str], max_length: int = 150) -
     if not text:
         return ""
 
-    # Находим позиции всех терминов запроса
-    positions = []
-    for term in query_terms:
-        start = 0
-        while True:
-            pos = text.lower().find(term.lower(), start)
-            if pos == -1:
-                break
-            positions.append((pos, pos + len(term)))
-            start = pos + 1
-
-    if not positions:
+    # Первое вхождение любого термина одним линейным проходом
+    first_pos = _find_first_term(
+        text.lower(), tuple(term.lower() for term in query_terms))
+
+    if first_pos is None:
         # Если термины не найдены, берем начало текста
         return text[:max_length] + "..." if len(text) > max_length else text
 
-    # Берем позицию первого найденного термина
-    first_pos = min(positions, key=lambda x: x[0])[0]
-
     # Выделяем контекст вокруг первого термина
     start = max(0, first_pos - max_length // 2)
     end = min(len(text), start + max_length)
@@ -165,16 +361,30 @@ class TextProcessor:
     """Класс для обработки текста"""
 
     def __init__(self, stop_words: Set[str] = None):
-        self.stop_words = stop_words or set()
-        self.punctuation = set(string.punctuation)
+        # frozenset: тот же O(1) lookup, но экземпляр иммутабелен и
+        # переживает fork через copy-on-write без дублирования
+        self.stop_words = frozenset(stop_words or ())
+        # Таблица для str.translate: удаление пунктуации идет на C,
+        # без посимвольного цикла с проверкой множества
+        self._punct_table = PUNCTUATION_TRANSLATE
+
+        # 256-байтная LUT для ASCII: нижний регистр и удаление
+        # пунктуации одним bytes.translate — один линейный проход с
+        # таблицей, целиком живущей в L1
+        lut = bytearray(range(256))
+        for code in range(ord('A'), ord('Z') + 1):
+            lut[code] = code + 32
+        self._byte_lut = bytes(lut)
+        self._punct_bytes = string.punctuation.encode('ascii')
 
     def preprocess(self, text: str) -> List[str]:
         """Предобработка текста"""
-        # Приведение к нижнему регистру
-        text = text.lower()
-
-        # Удаление пунктуации
-        text = ''.join([ch for ch in text if ch not in self.punctuation])
+        # Приведение к нижнему регистру и удаление пунктуации
+        if text.isascii():
+            text = text.encode('ascii').translate(
+                self._byte_lut, self._punct_bytes).decode('ascii')
+        else:
+            text = text.lower().translate(self._punct_table)
 
         # Токенизация
         tokens = text.split()
@@ -186,7 +396,10 @@ class TextProcessor:
 
     def create_ngrams(self, tokens: List[str], n: int = 2) -> List[str]:
         """Создание N-грамм"""
-        ngrams = []
-        for i in range(len(tokens) - n + 1):
-            ngrams.append(' '.join(tokens[i:i + n]))
-        return ngrams
\ No newline at end of file
+        if n == 1:
+            return list(tokens)
+
+        # zip по n сдвинутым срезам: итерация на C, без среза списка
+        # на каждой позиции
+        return [' '.join(gram)
+                for gram in zip(*(tokens[i:] for i in range(n)))]
\ No newline at end of file